@@ -0,0 +1,223 @@
+##===-- backtracewin.py --------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import lldb
+import threading
+from collections import OrderedDict
+
+def format_frame(frame):
+  text = '#%-4d 0x%016x %s' % (frame.GetFrameID(), frame.GetPC(),
+                               frame.GetFunctionName() or '???')
+  loc = frame.GetLineEntry()
+  f = loc.GetFileSpec()
+  if f.IsValid():
+    text += ' at %s:%d' % (f.GetFilename(), loc.GetLine())
+  return text
+
+class FramePages(object):
+  """ The formatted frames of one thread at one stop, read a page at a time.
+
+  count is None until the end of the stack was seen, either by reading
+  past it or by count_frames(), which asks for it on a worker thread:
+  GetNumFrames() unwinds the whole stack, which can take a while.
+  """
+  page_size = 256
+
+  def __init__(self, thread):
+    self.thread = thread
+    # page number -> [text]
+    self.pages = {}
+    self.count = None
+    self.counting = False
+
+  def get(self, i):
+    """ Returns the text of frame i, or None past the end of the stack. """
+    if i < 0 or (self.count is not None and i >= self.count):
+      return None
+    page = self.pages.get(i // self.page_size)
+    if page is None:
+      page = self.read_page(i // self.page_size)
+    offset = i % self.page_size
+    if offset < len(page):
+      return page[offset]
+    return None
+
+  def read_page(self, n):
+    page = []
+    first = n * self.page_size
+    for i in range(first, first + self.page_size):
+      if self.count is not None and i >= self.count:
+        break
+      frame = self.thread.GetFrameAtIndex(i)
+      if not frame.IsValid():
+        self.count = i
+        break
+      page.append(format_frame(frame))
+    self.pages[n] = page
+    return page
+
+  def count_frames(self, event_queue, done):
+    """ Calls done() on the UI thread once count is known. """
+    if self.count is not None:
+      done()
+      return
+    if self.counting:
+      return
+    self.counting = True
+    def worker():
+      count = self.thread.GetNumFrames()
+      def apply():
+        self.count = count
+        self.counting = False
+        done()
+      event_queue.post(apply)
+    t = threading.Thread(target = worker)
+    t.daemon = True
+    t.start()
+
+  def known(self):
+    """ Returns the number of frames known to exist. """
+    if self.count is not None:
+      return self.count
+    return sum(len(page) for page in self.pages.values())
+
+class BacktraceWalker(urwid.ListWalker):
+  cache_size = 256
+
+  def __init__(self, page_read):
+    # called after frames were read, which may have found the end
+    self.page_read = page_read
+    self.frames = None
+    self.selected = None
+    self.focus = 0
+    # frame index -> widget
+    self.widgets = OrderedDict()
+
+  def set_frames(self, frames, selected):
+    if frames is not self.frames or selected != self.selected:
+      self.frames = frames
+      self.focus = selected or 0
+    self.selected = selected
+    self.widgets.clear()
+    self._modified()
+
+  def get_focus(self):
+    return self._get_at_pos(self.focus)
+
+  def set_focus(self, focus):
+    self.focus = focus
+    self._modified()
+
+  def get_next(self, start_from):
+    return self._get_at_pos(start_from + 1)
+
+  def get_prev(self, start_from):
+    return self._get_at_pos(start_from - 1)
+
+  def _get_at_pos(self, pos):
+    if self.frames is None or pos < 0:
+      return None, None
+    w = self.widgets.pop(pos, None)
+    if w is None:
+      pages = len(self.frames.pages)
+      text = self.frames.get(pos)
+      if len(self.frames.pages) != pages:
+        self.page_read()
+      if text is None:
+        return None, None
+      marker = '* ' if pos == self.selected else '  '
+      w = urwid.AttrWrap(urwid.Text(marker + text), None, 'key')
+    self.widgets[pos] = w
+    if len(self.widgets) > self.cache_size:
+      self.widgets.popitem(last = False)
+    return w, pos
+
+class BacktraceWin(urwid.Frame):
+  """ Backtrace of the selected thread. Frames are read as they are
+  scrolled to, and cached for the stop; 'end' jumps to the outermost frame
+  once the depth of the stack is known. Enter selects a frame.
+  """
+  def __init__(self, event_queue, driver):
+    self.event_queue = event_queue
+    self.driver = driver
+    self.walker = BacktraceWalker(self.update_status)
+    self.status = urwid.Text('')
+    super(BacktraceWin, self).__init__(body = urwid.ListBox(self.walker),
+                                       header = self.status)
+    # (pid, stop id, tid) -> FramePages, for the threads seen at this stop
+    self.cache = {}
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitStateChanged,
+        lldb.SBThread.GetBroadcasterClassName():
+            lldb.SBThread.eBroadcastBitStackChanged
+          | lldb.SBThread.eBroadcastBitSelectedFrameChanged
+          | lldb.SBThread.eBroadcastBitThreadSelected,
+      })
+
+  def keypress(self, size, key):
+    frames = self.walker.frames
+    if frames is not None:
+      if key == 'home':
+        self.walker.set_focus(0)
+        return None
+      if key == 'end':
+        frames.count_frames(self.event_queue, lambda: self.show_end(frames))
+        self.update_status()
+        return None
+      if key == 'enter':
+        self.driver.handleCommandAsync('frame select %d' % self.walker.focus)
+        return None
+    return super(BacktraceWin, self).keypress(size, key)
+
+  def show_end(self, frames):
+    if frames is not self.walker.frames:
+      return
+    self.walker.set_focus(max(0, frames.count - 1))
+    self.update_status()
+
+  def update_status(self):
+    frames = self.walker.frames
+    if frames is None:
+      return
+    if frames.counting:
+      self.status.set_text('counting frames...')
+    elif frames.count is None:
+      self.status.set_text('%d+ frames' % frames.known())
+    else:
+      self.status.set_text('%d frames' % frames.count)
+
+  def handle_lldb_event(self, event):
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    snapshot = self.driver.stop_snapshot
+    if snapshot is None:
+      # the frames of a running thread cannot be read
+      self.walker.set_frames(None, None)
+      self.cache.clear()
+      self.status.set_text('(process not stopped)')
+      return
+    thread = snapshot.selected_thread()
+    if thread is None:
+      self.walker.set_frames(None, None)
+      self.status.set_text('no thread selected')
+      return
+    key = (snapshot.pid, snapshot.stop_id, thread.tid)
+    frames = self.cache.get(key)
+    if frames is None:
+      # the frames of earlier stops are stale
+      for old in [k for k in self.cache if k[:2] != key[:2]]:
+        del self.cache[old]
+      process = self.driver.getTarget().GetProcess()
+      frames = self.cache[key] = FramePages(process.GetThreadByID(thread.tid))
+    selected = thread.frame.index if thread.frame is not None else 0
+    self.walker.set_frames(frames, selected)
+    self.update_status()
@@ -0,0 +1,358 @@
+#!/usr/bin/env python
+##===-- bench.py ---------------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+"""
+Headless benchmarks of the UI pipeline.
+
+Builds a layout on top of the stand-in lldb module (fakelldb.py), pushes
+synthetic event storms through LLDBEventQueue and renders the view after
+each drain, as the main loop would. Each scenario runs in a forked process
+and reports the time spent in each listener, the number of text widgets
+created and the peak memory. Needs urwid, but neither lldb nor a terminal.
+
+$ ./bench.py --threads 5000 --locations 2000 --lines 100000
+"""
+
+import sys
+import fakelldb
+sys.modules['lldb'] = fakelldb
+
+import argparse
+import json
+import os
+import resource
+import tempfile
+import time
+
+import urwid
+
+import lldb
+import eventlog
+import layout
+import lui
+
+bench_layout = """
+{
+  "default" :
+  {
+    "cols" : [
+      { "rows" : [ "source", "command" ] },
+      { "rows" : [
+          { "cols" : [ "breakpoints", "threads" ] },
+          { "cols" : [ "backtrace", "events" ] },
+          { "cols" : [ "output", "modules" ] }
+        ]
+      }
+    ]
+  }
+}
+"""
+
+class BenchDriver(eventlog.ReplayDriver):
+  """ A driver without a log: the scenarios queue the events themselves. """
+  def __init__(self, event_queue):
+    eventlog.ReplayDriver.__init__(self, event_queue, None, 0)
+
+class ListenerStats(object):
+  def __init__(self):
+    self.calls = 0
+    self.events = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def add(self, elapsed, events):
+    self.calls += 1
+    self.events += events
+    self.total += elapsed
+    self.max = max(self.max, elapsed)
+
+def timed(method, stats, count):
+  def wrapper(arg, *args):
+    start = time.time()
+    method(arg, *args)
+    stats.add(time.time() - start, count(arg))
+  return wrapper
+
+class Bench(object):
+  """ A view over a BenchDriver whose listeners are timed. """
+  def __init__(self, size, batch):
+    self.size = size
+    self.batch = batch
+    self.queue = lui.LLDBEventQueue(max_events = 10000)
+    self.driver = BenchDriver(self.queue)
+    self.view = lui.LLDBView(self.queue, self.driver)
+    self.stats = {}
+    self.drains = 0
+    self.render_time = 0.0
+    self.queued = 0
+
+    for listener, subscriptions in self.queue.listeners:
+      stats = self.stats.setdefault(listener.__class__.__name__, ListenerStats())
+      if hasattr(listener, 'handle_lldb_events'):
+        listener.handle_lldb_events = timed(listener.handle_lldb_events, stats, len)
+      else:
+        listener.handle_lldb_event = timed(listener.handle_lldb_event, stats,
+                                           lambda event: 1)
+    # module events reach the windows as batched updates instead
+    modules = self.driver.modules
+    modules.apply = timed(modules.apply, self.stats.setdefault('modules', ListenerStats()),
+                          len)
+
+  def put(self, event):
+    # as the driver thread would
+    self.driver.dispatchEvent(event)
+    self.queued += 1
+    if self.queued % self.batch == 0:
+      self.drain()
+
+  def drain(self):
+    """ Dispatches the queued events and renders, like one UI wakeup. """
+    self.queue(None)
+    start = time.time()
+    self.view.render(self.size, focus = True)
+    self.render_time += time.time() - start
+    self.drains += 1
+
+def write_source(lines):
+  f = tempfile.NamedTemporaryFile(suffix = '.c', delete = False)
+  for i in range(lines):
+    f.write('int f%d(int x) { return x * %d; }\n' % (i, i))
+  f.close()
+  return f.name
+
+def process_event(process, state):
+  return lldb.SBEvent(lldb.SBProcess.GetBroadcasterClassName(),
+                      lldb.SBProcess.eBroadcastBitStateChanged,
+                      'process %d %s' % (process.GetProcessID(), state),
+                      process = process, state = state)
+
+def make_process(bench, threads, path):
+  directory, filename = os.path.split(path)
+  thread_list = []
+  for i in range(threads):
+    entry = lldb.SBLineEntry(lldb.SBFileSpec(directory, filename), i % 1000 + 1)
+    reason = lldb.eStopReasonBreakpoint if i == 0 else lldb.eStopReasonNone
+    thread_list.append(lldb.SBThread(tid = 1000 + i, index_id = i + 1,
+                                     stop_reason = reason,
+                                     frames = [lldb.SBFrame(entry, 'f%d' % i)]))
+  target = bench.driver.target
+  target.valid = True
+  target.desc = 'a.out'
+  process = lldb.SBProcess(target, 4242, lldb.eStateStopped, threads = thread_list,
+                           stop_id = 1)
+  target.process = process
+  return process
+
+def scenario_threads(bench, args):
+  """ A process with N threads stops and each thread reports a new stack. """
+  path = write_source(1000)
+  try:
+    process = make_process(bench, args.threads, path)
+    bench.put(process_event(process, lldb.eStateStopped))
+    for thread in process:
+      bench.put(lldb.SBEvent(lldb.SBThread.GetBroadcasterClassName(),
+                             lldb.SBThread.eBroadcastBitStackChanged,
+                             'thread %d stack changed' % thread.GetThreadID(),
+                             thread = thread))
+    bench.drain()
+  finally:
+    os.remove(path)
+
+def scenario_breakpoints(bench, args):
+  """ A breakpoint on a symbol resolves M locations one event at a time. """
+  path = write_source(args.locations)
+  try:
+    process = make_process(bench, 1, path)
+    bench.put(process_event(process, lldb.eStateStopped))
+    filename = os.path.basename(path)
+    bp = lldb.SBBreakpoint(1, desc = "SBBreakpoint: id = 1, name = 'f', locations = 0")
+    target = bench.driver.target
+    target.breakpoints = [bp]
+    bench.put(lldb.SBEvent(lldb.SBTarget.GetBroadcasterClassName(),
+                           lldb.SBTarget.eBroadcastBitBreakpointChanged,
+                           'breakpoint 1 added', breakpoint = bp,
+                           breakpoint_event_type = lldb.eBreakpointEventTypeAdded))
+    for i in range(args.locations):
+      location = lldb.SBBreakpointLocation(i + 1,
+          '1.%d: where = a.out`f%d + 4 at %s:%d, address = 0x%x, resolved'
+          % (i + 1, i, filename, i + 1, 0x1000 + i * 16))
+      bp.locations.append(location)
+      bp.desc = "SBBreakpoint: id = 1, name = 'f', locations = %d" % (i + 1)
+      bench.put(lldb.SBEvent(lldb.SBTarget.GetBroadcasterClassName(),
+                             lldb.SBTarget.eBroadcastBitBreakpointChanged,
+                             'breakpoint 1 location resolved', breakpoint = bp,
+                             breakpoint_event_type = lldb.eBreakpointEventTypeLocationsResolved,
+                             locations = [location]))
+    bench.drain()
+  finally:
+    os.remove(path)
+
+def scenario_stdout(bench, args):
+  """ The running process writes K lines to stdout, a few lines per event. """
+  target = bench.driver.target
+  target.valid = True
+  process = lldb.SBProcess(target, 4242, lldb.eStateRunning)
+  bench.put(process_event(process, lldb.eStateRunning))
+  output = bench.driver.process_output
+  written = 0
+  while written < args.lines:
+    n = min(args.lines_per_event, args.lines - written)
+    output.append(''.join('line %d of the output\n' % (written + i) for i in range(n)),
+                  False)
+    written += n
+    bench.put(lldb.SBEvent(lldb.SBProcess.GetBroadcasterClassName(),
+                           lldb.SBProcess.eBroadcastBitSTDOUT, 'stdout',
+                           process = process, state = lldb.eStateRunning))
+  bench.drain()
+
+def scenario_modules(bench, args):
+  """ The process dlopens L libraries, a few per event, then unloads half. """
+  target = bench.driver.target
+  libs = [lldb.SBModule(lldb.SBFileSpec('/usr/lib', 'lib%d.so' % i),
+                        '%032X' % i, 0x7f0000000000 + i * 0x100000,
+                        lldb.SBFileSpec('/usr/lib', 'lib%d.so' % i) if i % 3 else None)
+          for i in range(args.libraries)]
+  for event_type, libs in [(lldb.SBTarget.eBroadcastBitModulesLoaded, libs),
+                           (lldb.SBTarget.eBroadcastBitModulesUnloaded, libs[::2])]:
+    for i in range(0, len(libs), args.modules_per_event):
+      bench.put(lldb.SBEvent(lldb.SBTarget.GetBroadcasterClassName(), event_type,
+                             'modules', target = target,
+                             modules = libs[i:i + args.modules_per_event]))
+  bench.driver.modules.flush()
+  bench.drain()
+
+scenarios = [
+    ('threads', scenario_threads),
+    ('breakpoints', scenario_breakpoints),
+    ('stdout', scenario_stdout),
+    ('modules', scenario_modules),
+  ]
+
+def run_scenario(run, args):
+  """ Runs a scenario in this process and returns its results. """
+  text_init = urwid.Text.__init__
+  widgets = [0]
+  def counting_init(self, *a, **kw):
+    widgets[0] += 1
+    text_init(self, *a, **kw)
+
+  bench = Bench((args.width, args.height), args.batch)
+  urwid.Text.__init__ = counting_init
+  start = time.time()
+  try:
+    run(bench, args)
+  finally:
+    urwid.Text.__init__ = text_init
+  elapsed = time.time() - start
+
+  return {
+      'time': elapsed,
+      'render': bench.render_time,
+      'drains': bench.drains,
+      'events': bench.queue.events,
+      'dropped': bench.queue.dropped,
+      'merged': bench.queue.merged,
+      'coalesced': bench.queue.coalesced,
+      'module_updates': bench.driver.modules.updates,
+      'widgets': widgets[0],
+      # kilobytes on Linux
+      'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+      'listeners': dict((name, s.__dict__) for name, s in bench.stats.items()),
+    }
+
+def fork_scenario(run, args):
+  """ Runs a scenario in a child process, so that its peak memory is its own. """
+  r, w = os.pipe()
+  pid = os.fork()
+  if pid == 0:
+    os.close(r)
+    status = 0
+    try:
+      result = run_scenario(run, args)
+    except Exception as e:
+      result = { 'error': '%s: %s' % (e.__class__.__name__, e) }
+      status = 1
+    with os.fdopen(w, 'w') as f:
+      json.dump(result, f)
+    os._exit(status)
+  os.close(w)
+  with os.fdopen(r) as f:
+    data = f.read()
+  os.waitpid(pid, 0)
+  return json.loads(data)
+
+def report(name, result):
+  print '%s' % name
+  if 'error' in result:
+    print '  error: %s' % result['error']
+    return
+  print '  total %.1f ms, render %.1f ms, %d drains, %d events ' \
+        '(%d coalesced, %d merged, %d dropped)' % (
+        result['time'] * 1000, result['render'] * 1000, result['drains'],
+        result['events'], result['coalesced'], result['merged'], result['dropped'])
+  if result['module_updates'] > 0:
+    print '  module events folded into %d updates' % result['module_updates']
+  print '  %d text widgets, peak rss %d KB' % (result['widgets'], result['peak_rss'])
+  listeners = sorted(result['listeners'].items(), key = lambda l: -l[1]['total'])
+  for listener, s in listeners:
+    if s['calls'] == 0:
+      continue
+    print '  %-12s %6d calls %8d events %9.2f ms total %8.2f ms max' % (
+        listener, s['calls'], s['events'], s['total'] * 1000, s['max'] * 1000)
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark the lui windows')
+  parser.add_argument("scenario", nargs='*',
+                      help="scenarios to run (%s)" % ', '.join(n for n, s in scenarios))
+  parser.add_argument("--threads", type=int, default=1000,
+                      help="threads stopping in the threads scenario")
+  parser.add_argument("--locations", type=int, default=1000,
+                      help="locations resolving in the breakpoints scenario")
+  parser.add_argument("--lines", type=int, default=100000,
+                      help="lines written in the stdout scenario")
+  parser.add_argument("--lines-per-event", dest="lines_per_event", type=int,
+                      default=10, help="lines written per stdout event")
+  parser.add_argument("--libraries", type=int, default=5000,
+                      help="libraries loaded in the modules scenario")
+  parser.add_argument("--modules-per-event", dest="modules_per_event", type=int,
+                      default=4, help="libraries loaded per module event")
+  parser.add_argument("--batch", type=int, default=100,
+                      help="events queued per UI wakeup")
+  parser.add_argument("--width", type=int, default=200)
+  parser.add_argument("--height", type=int, default=60)
+  parser.add_argument("--layout",
+                      help="Load layout from file")
+  parser.add_argument("--json", action='store_true',
+                      help="print the results as JSON")
+  args = parser.parse_args()
+
+  if args.layout:
+    with open(args.layout) as f:
+      layout.load_layout(f.read())
+  else:
+    layout.load_layout(bench_layout)
+
+  names = args.scenario or [n for n, s in scenarios]
+  known = dict(scenarios)
+  results = {}
+  failed = False
+  for name in names:
+    if name not in known:
+      parser.error("unknown scenario '%s'" % name)
+    results[name] = fork_scenario(known[name], args)
+    failed = failed or 'error' in results[name]
+    if not args.json:
+      report(name, results[name])
+  if args.json:
+    print json.dumps(results, indent = 2, sort_keys = True)
+  sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+  main()
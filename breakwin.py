@@ -72,7 +72,7 @@ class BreakWalker(urwid.ListWalker):
       #    text += '\n  ' + desc
 
       self.breaks.append(urwid.Text(text))
-      self._modified()
+    self._modified()
 
     #self.setSelected(selected)
 
@@ -80,12 +80,18 @@ class BreakWin(urwid.ListBox):
   def __init__(self, event_queue, driver):
     self.walker = BreakWalker(driver)
     super(BreakWin, self).__init__(self.walker)
-    event_queue.add_listener(self)
+    event_queue.add_listener(self, {
+        lldb.SBTarget.GetBroadcasterClassName():
+            lldb.SBTarget.eBroadcastBitBreakpointChanged
+      })
     self.driver = driver
 
   def handle_lldb_event(self, event):
-    if lldb.SBBreakpoint.EventIsBreakpointEvent(event):
-      self.walker.update()
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    # only subscribed to breakpoint events
+    self.walker.update()
 
   #  if isinstance(event, int):
   #    if event == ord('d'):
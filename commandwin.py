@@ -52,13 +52,32 @@ class CommandWalker(urwid.ListWalker):
   def __init__(self):
     self.lines = []
     self.focus = 0
+    # attr of the last line while it is still missing its newline
+    self.partial = None
 
   def output(self, out, attr):
+    self.partial = None
     for line in out.split('\n'):
       text = urwid.AttrWrap(urwid.Text(line), attr)
       self.lines.append(text)
     self.set_focus(len(self.lines)-1)
 
+  def stream(self, data, attr):
+    """ Appends a chunk of output that may start or end mid-line. """
+    lines = data.split('\n')
+    if self.partial == attr:
+      text = self.lines[-1].original_widget
+      text.set_text(text.text + lines.pop(0))
+    for line in lines:
+      self.lines.append(urwid.AttrWrap(urwid.Text(line), attr))
+    if data.endswith('\n'):
+      # drop the empty line that follows the newline
+      self.lines.pop()
+      self.partial = None
+    else:
+      self.partial = attr
+    self.set_focus(len(self.lines)-1)
+
   def add(self, out):
     self.output(out, 'body')
 
@@ -88,16 +107,20 @@ class CommandWalker(urwid.ListWalker):
 
 class CommandEdit(urwid.Edit):
   """ Embed an 'editline'-compatible prompt inside a urwid.Edit widget. """
-  def __init__(self, prompt, history, enter_callback, tab_complete_callback):
+  def __init__(self, prompt, history, enter_callback, tab_complete_callback,
+               cancel_callback):
     self.history = history
     self.enter_callback = enter_callback
     self.tab_complete_callback = tab_complete_callback
+    self.cancel_callback = cancel_callback
     super(CommandEdit, self).__init__(caption = prompt, allow_tab = False)
 
   def keypress(self, size, key):
     if key == 'enter':
       self.enter_callback(self.get_edit_text())
       self.set_edit_text('')
+    elif key == 'esc':
+      self.cancel_callback()
     elif key == 'tab':
       completion = self.tab_complete_callback(self.get_edit_text())
       if len(completion) > 0:
@@ -127,12 +150,19 @@ class CommandEdit(urwid.Edit):
     return None
 
 class CommandWin(urwid.Frame):
-  def __init__(self, driver):
+  """ Command prompt and output. Commands run on the driver's command thread,
+      their output is streamed in as it is produced and esc interrupts the
+      command that is running.
+  """
+  def __init__(self, event_queue, driver):
     self.command = ""
     self.data = ""
     #driver.setSize(w, h)
+    self.event_queue = event_queue
     self.driver = driver
     self.history = History()
+    # futures of the commands that have not completed yet
+    self.running = []
 
     self.walker = CommandWalker()
     self.output = urwid.ListBox(self.walker)
@@ -153,10 +183,15 @@ class CommandWin(urwid.Frame):
           self.walker.add(m)
         return ''
 
+    def cancel_callback():
+      if len(self.running) > 0:
+        self.driver.cancelCommand(self.running[0])
+
     self.edit = CommandEdit(self.driver.getPrompt(),
                             self.history,
                             enter_callback,
-                            tab_complete_callback)
+                            tab_complete_callback,
+                            cancel_callback)
 
     super(CommandWin, self).__init__(body = self.output, footer = self.edit)
 
@@ -171,8 +206,28 @@ class CommandWin(urwid.Frame):
       return
 
     self.history.add(cmd)
-    ret = self.driver.handleCommand(cmd)
-    if ret.Succeeded():
+
+    def output_callback(data, is_error):
+      attr = 'error' if is_error else 'body'
+      self.event_queue.post(lambda: self.walker.stream(data, attr))
+
+    def done_callback(future):
+      self.event_queue.post(lambda: self.command_done(future))
+
+    future = self.driver.handleCommandAsync(cmd, output_callback)
+    self.running.append(future)
+    future.add_done_callback(done_callback)
+
+  def command_done(self, future):
+    self.running.remove(future)
+    ret = future.result()
+    if ret is None:
+      self.walker.error("'%s' cancelled" % future.cmd)
+    elif future.streamed:
+      # the output is already shown
+      if future.cancelled:
+        self.walker.error('interrupted')
+    elif ret.Succeeded():
       out = ret.GetOutput()
       self.walker.add(out)
     else:
@@ -10,8 +10,116 @@
 
 import lldb
 import lldbutil
+import modules
+import profiledata
+import stopstate
+import os
+import select
 import sys
-from threading import Thread
+import time
+import Queue
+from collections import deque
+from threading import Thread, Event, Lock
+
+class CommandFuture(object):
+    """ The pending result of a command queued with handleCommandAsync. """
+    def __init__(self, cmd, output_callback=None):
+        self.cmd = cmd
+        self.output_callback = output_callback
+        self.ret = None
+        self.started = False
+        self.cancelled = False
+        # True once some output was delivered through output_callback
+        self.streamed = False
+        self.callbacks = []
+        self.lock = Lock()
+        self.finished = Event()
+
+    def done(self):
+        return self.finished.is_set()
+
+    def result(self, timeout=None):
+        """ Waits for the command and returns its SBCommandReturnObject, which is
+            None if the command was cancelled before it started.
+        """
+        self.finished.wait(timeout)
+        return self.ret
+
+    def add_done_callback(self, callback):
+        """ Calls callback(future) on the command thread once the command is
+            done, or right away if it already is.
+        """
+        with self.lock:
+            if not self.done():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def start(self):
+        with self.lock:
+            if self.cancelled:
+                return False
+            self.started = True
+            return True
+
+    def output(self, data, is_error):
+        self.streamed = True
+        if self.output_callback is not None:
+            self.output_callback(data, is_error)
+
+    def set_result(self, ret):
+        with self.lock:
+            self.ret = ret
+            self.finished.set()
+            callbacks = self.callbacks
+            self.callbacks = []
+        for callback in callbacks:
+            callback(self)
+
+class ProcessOutput(object):
+    """ Ring buffer of the last max_lines lines written by the inferior.
+
+    Lines are numbered from the start of the session; first is the number of
+    the oldest line still kept and total the number of lines so far. Written
+    by the driver thread, read by the UI.
+    """
+    def __init__(self, max_lines=10000, max_line_length=4096):
+        self.lines = deque(maxlen=max_lines)
+        self.max_line_length = max_line_length
+        self.first = 0
+        self.total = 0
+        # is_error of the last line while it is still missing its newline
+        self.partial = None
+        self.lock = Lock()
+
+    def append(self, data, is_error):
+        with self.lock:
+            parts = data.split('\n')
+            if self.partial == is_error and len(self.lines) > 0:
+                parts[0] = self.lines.pop()[1] + parts[0]
+                self.total -= 1
+            ends_line = data.endswith('\n')
+            if ends_line:
+                # nothing follows the last newline
+                parts.pop()
+            for part in parts:
+                self.add_line(is_error, part)
+            self.partial = None if ends_line else is_error
+            self.first = self.total - len(self.lines)
+
+    def add_line(self, is_error, text):
+        # lines that are too long are split, so one line cannot eat memory
+        n = self.max_line_length
+        for i in range(0, max(len(text), 1), n):
+            self.lines.append((is_error, text[i:i + n]))
+            self.total += 1
+
+    def get(self, lineno):
+        """ Returns (is_error, text) of line lineno, or None if not kept. """
+        with self.lock:
+            if lineno < self.first or lineno >= self.total:
+                return None
+            return self.lines[lineno - self.first]
 
 class DebuggerDriver(Thread):
     """ Drives the debugger and responds to events. """
@@ -20,6 +128,20 @@ class DebuggerDriver(Thread):
         self.event_queue = event_queue
         # This is probably not great because it does not give liblldb a chance to clean up
         self.daemon = True
+        self.commands = Queue.Queue()
+        self.process_output = ProcessOutput()
+        self.command_thread = None
+        self.current_command = None
+        # EventRecorder logging the events handed to the UI, if any
+        self.recorder = None
+        # timing.Timings of the commands, if enabled
+        self.timings = None
+        # stopstate.StopSnapshot of the last stop, None while not stopped
+        self.stop_snapshot = None
+        self.modules = modules.ModuleTracker(event_queue)
+        self.profile = profiledata.ProfileData()
+        # called with each CommandFuture run on the command thread
+        self.command_listeners = []
         self.initialize(debugger)
 
     def initialize(self, debugger):
@@ -32,10 +154,10 @@ class DebuggerDriver(Thread):
         self.listener.StartListeningForEventClass(self.debugger,
                                              lldb.SBTarget.GetBroadcasterClassName(),
                                              lldb.SBTarget.eBroadcastBitBreakpointChanged
-                                           #| lldb.SBTarget.eBroadcastBitModuleLoaded
-                                           #| lldb.SBTarget.eBroadcastBitModuleUnloaded
+                                           | lldb.SBTarget.eBroadcastBitModulesLoaded
+                                           | lldb.SBTarget.eBroadcastBitModulesUnloaded
                                            | lldb.SBTarget.eBroadcastBitWatchpointChanged
-                                           #| lldb.SBTarget.eBroadcastBitSymbolLoaded
+                                           | lldb.SBTarget.eBroadcastBitSymbolsLoaded
                                            )
 
         self.listener.StartListeningForEventClass(self.debugger,
@@ -101,9 +223,115 @@ class DebuggerDriver(Thread):
 
     def handleCommand(self, cmd):
         ret = lldb.SBCommandReturnObject()
-        self.getCommandInterpreter().HandleCommand(cmd, ret)
+        self.runCommand(cmd, ret)
         return ret
 
+    def runCommand(self, cmd, ret):
+        if self.timings is None:
+            self.getCommandInterpreter().HandleCommand(cmd, ret)
+        else:
+            start = time.time()
+            self.getCommandInterpreter().HandleCommand(cmd, ret)
+            self.timings.add('handleCommand', time.time() - start)
+
+    def addCommandListener(self, callback):
+        """ Calls callback(future) on the command thread after each command
+            queued with handleCommandAsync has run.
+        """
+        self.command_listeners.append(callback)
+
+    def handleCommandAsync(self, cmd, output_callback=None):
+        """ Queues cmd to be run on the command thread and returns a
+            CommandFuture. Commands run one at a time, in order. If given,
+            output_callback(data, is_error) is called from a worker thread with
+            the command's output as it is produced.
+        """
+        future = CommandFuture(cmd, output_callback)
+        if self.command_thread is None:
+            self.command_thread = Thread(target=self.commandLoop)
+            self.command_thread.daemon = True
+            self.command_thread.start()
+        self.commands.put(future)
+        return future
+
+    def cancelCommand(self, future):
+        """ Cancels a queued command, or interrupts it if it is running. """
+        with future.lock:
+            future.cancelled = True
+            if not future.started or future.done():
+                return
+        if hasattr(self.debugger, 'RequestInterrupt'):
+            self.debugger.RequestInterrupt()
+        else:
+            self.debugger.DispatchInputInterrupt()
+        process = self.getTarget().GetProcess()
+        if process.IsValid() and process.GetState() == lldb.eStateRunning:
+            process.SendAsyncInterrupt()
+
+    def commandLoop(self):
+        while True:
+            future = self.commands.get()
+            if not future.start():
+                future.set_result(None)
+                continue
+            self.current_command = future
+            ret = lldb.SBCommandReturnObject()
+            try:
+                self.runStreamed(future, ret)
+            except Exception as e:
+                # keep the loop alive for the commands queued after this one
+                ret.SetError('error: %s' % e)
+            finally:
+                if future.cancelled and hasattr(self.debugger, 'CancelInterruptRequest'):
+                    self.debugger.CancelInterruptRequest()
+                self.current_command = None
+                future.set_result(ret)
+            for callback in self.command_listeners:
+                callback(future)
+
+    def runStreamed(self, future, ret):
+        """ Runs the command of future, streaming its output through pipes. """
+        out_r, out_w = os.pipe()
+        try:
+            err_r, err_w = os.pipe()
+        except:
+            os.close(out_r)
+            os.close(out_w)
+            raise
+        out_file = os.fdopen(out_w, 'w', 0)
+        err_file = os.fdopen(err_w, 'w', 0)
+        reader = Thread(target=self.streamOutput, args=(future, out_r, err_r))
+        reader.daemon = True
+        try:
+            reader.start()
+        except:
+            out_file.close()
+            err_file.close()
+            os.close(out_r)
+            os.close(err_r)
+            raise
+        try:
+            ret.SetImmediateOutputFile(out_file)
+            ret.SetImmediateErrorFile(err_file)
+            self.runCommand(future.cmd, ret)
+        finally:
+            # the reader stops once both pipes are closed
+            out_file.close()
+            err_file.close()
+            reader.join()
+
+    def streamOutput(self, future, out_fd, err_fd):
+        fds = { out_fd : False, err_fd : True }
+        while len(fds) > 0:
+            ready, _, _ = select.select(fds.keys(), [], [])
+            for fd in ready:
+                data = os.read(fd, 65536)
+                if len(data) == 0:
+                    os.close(fd)
+                    del fds[fd]
+                else:
+                    future.output(data, fds[fd])
+
     def eventLoop(self):
         while not self.isDone():
             event = lldb.SBEvent()
@@ -114,7 +342,95 @@ class DebuggerDriver(Thread):
             elif not event.GetBroadcaster().IsValid():
                 continue
 
-            self.event_queue.put(event)
+            chunks = None
+            profile = None
+            if lldb.SBProcess.EventIsProcessEvent(event):
+                chunks = self.readProcessOutput(event)
+                profile = self.readProfileData(event)
+            if self.recorder is not None:
+                self.recorder.record(event, chunks, self.getTarget(), profile)
+            self.dispatchEvent(event)
+
+    def dispatchEvent(self, event):
+        """ Hands event to the UI, once the driver has taken what it needs. """
+        self.updateSnapshot(event)
+        if lldb.SBProcess.EventIsProcessEvent(event) \
+                and event.GetType() & lldb.SBProcess.eBroadcastBitStateChanged \
+                and lldb.SBProcess.GetStateFromEvent(event) in (lldb.eStateExited,
+                                                                lldb.eStateDetached):
+            # nothing is loaded anymore
+            self.modules.reset(lldb.SBProcess.GetProcessFromEvent(event).GetTarget())
+        if event.GetBroadcasterClass() == lldb.SBTarget.GetBroadcasterClassName() \
+                and event.GetType() & modules.module_events:
+            # folded into batched updates rather than queued one by one
+            self.modules.add_event(event, lldb.SBTarget.GetTargetFromEvent(event))
+            return
+        self.event_queue.put(event)
+
+    def updateSnapshot(self, event):
+        """ Takes a snapshot of the process when it stops, before the windows
+            see event, so that they do not each query the stop themselves.
+        """
+        if lldb.SBProcess.EventIsProcessEvent(event):
+            if not event.GetType() & lldb.SBProcess.eBroadcastBitStateChanged \
+                    or lldb.SBProcess.GetRestartedFromEvent(event):
+                return
+            process = lldb.SBProcess.GetProcessFromEvent(event)
+            state = lldb.SBProcess.GetStateFromEvent(event)
+            if not process.IsValid() or state not in (lldb.eStateStopped, lldb.eStateCrashed):
+                self.stop_snapshot = None
+                return
+            snapshot = self.stop_snapshot
+            if snapshot is None or snapshot.pid != process.GetProcessID() \
+                    or snapshot.stop_id != process.GetStopID():
+                self.stop_snapshot = stopstate.take(process)
+        elif lldb.SBThread.EventIsThreadEvent(event):
+            snapshot = self.stop_snapshot
+            if snapshot is None:
+                return
+            thread = lldb.SBThread.GetThreadFromEvent(event)
+            process = thread.GetProcess()
+            if thread.IsValid() and process.GetProcessID() == snapshot.pid:
+                self.stop_snapshot = stopstate.update_thread(snapshot, process, thread)
+
+    def readProcessOutput(self, event):
+        """ Moves whatever the inferior wrote to stdout/stderr into process_output.
+            Returns the (data, is_error) chunks read.
+        """
+        chunks = []
+        event_type = event.GetType()
+        if not event_type & (lldb.SBProcess.eBroadcastBitSTDOUT
+                           | lldb.SBProcess.eBroadcastBitSTDERR
+                           | lldb.SBProcess.eBroadcastBitStateChanged):
+            return chunks
+        process = lldb.SBProcess.GetProcessFromEvent(event)
+        if not process.IsValid():
+            return chunks
+        for read, is_error in [(process.GetSTDOUT, False), (process.GetSTDERR, True)]:
+            while True:
+                data = read(65536)
+                if not data:
+                    break
+                self.process_output.append(data, is_error)
+                chunks.append((data, is_error))
+        return chunks
+
+    def readProfileData(self, event):
+        """ Feeds the profile data of a process event to self.profile.
+            Returns the data read.
+        """
+        if not event.GetType() & lldb.SBProcess.eBroadcastBitProfileData:
+            return None
+        process = lldb.SBProcess.GetProcessFromEvent(event)
+        data = []
+        while process.IsValid():
+            chunk = process.GetAsyncProfileData(65536)
+            if not chunk:
+                break
+            data.append(chunk)
+        data = ''.join(data)
+        self.profile.add_data(data)
+        return data
 
     def run(self):
         self.eventLoop()
@@ -0,0 +1,314 @@
+##===-- eventlog.py ------------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+"""
+Recording of the events leaving the driver, and their offline replay.
+
+The log has one JSON object per event, with the state the windows query
+about it:
+  t    seconds since the recording started
+  c, e broadcaster class and event type
+  d    description of the event
+  p    process, after state changes: pid, stop ID, state, exit status,
+       target description, selected thread index and threads
+  s, r state and restarted flag carried by a state change
+  th   thread of a thread event; the replay updates it in the process of
+       the last state change
+  bp   breakpoint of a breakpoint event, bt its event type and el the
+       locations carried by the event
+  bps  the target's breakpoints, after breakpoint events
+  m    modules of a module event: [path, uuid, load address, symbols]
+  out  [data, is_error] chunks the driver read from the inferior
+  prof profile data the driver read
+Threads are [tid, index id, name, stop reason, frame] and frames are
+[directory, filename, line, function, frame index, pc]. Breakpoints are [id, internal,
+enabled, description, locations] and locations [id, description].
+"""
+
+import json
+import os
+import sys
+import time
+from threading import Lock
+
+import lldb
+import lldbutil
+import debuggerdriver
+import modules
+
+def to_text(s):
+  if s is None:
+    return None
+  return s.decode('utf-8', 'replace')
+
+def frame_record(frame):
+  if not frame.IsValid():
+    return None
+  loc = frame.GetLineEntry()
+  f = loc.GetFileSpec()
+  function = to_text(frame.GetFunctionName())
+  if not f.IsValid():
+    return [None, None, 0, function, frame.GetFrameID(), frame.GetPC()]
+  return [to_text(f.GetDirectory()), to_text(f.GetFilename()), loc.GetLine(),
+          function, frame.GetFrameID(), frame.GetPC()]
+
+def thread_record(thread):
+  return [thread.GetThreadID(), thread.GetIndexID(), to_text(thread.GetName()),
+          thread.GetStopReason(), frame_record(thread.GetSelectedFrame())]
+
+def process_record(process):
+  if not process.IsValid():
+    return None
+  threads = []
+  selected = 0
+  selected_tid = process.GetSelectedThread().GetThreadID()
+  for i in range(process.GetNumThreads()):
+    thread = process.GetThreadAtIndex(i)
+    if thread.GetThreadID() == selected_tid:
+      selected = i
+    threads.append(thread_record(thread))
+  return {
+      'pid': process.GetProcessID(),
+      'stop': process.GetStopID(),
+      'state': process.GetState(),
+      'exit': process.GetExitStatus(),
+      'target': to_text(lldbutil.get_description(process.GetTarget())),
+      'sel': selected,
+      'threads': threads,
+    }
+
+def location_record(location):
+  return [location.GetID(),
+          to_text(lldbutil.get_description(location, lldb.eDescriptionLevelFull))]
+
+def breakpoint_record(bp):
+  return [bp.GetID(), bp.IsInternal(), bp.IsEnabled(),
+          to_text(lldbutil.get_description(bp)),
+          [location_record(location) for location in bp]]
+
+class EventRecorder(object):
+  """ Writes the events handed to record() to the log at path, replacing
+  any previous recording there.
+  """
+  def __init__(self, path):
+    self.file = open(path, 'w')
+    self.start = time.time()
+    self.lock = Lock()
+
+  def record(self, event, chunks = None, target = None, profile = None):
+    """ Called on the driver thread, before the event is queued. chunks are
+        the (data, is_error) pairs the driver read for this event, target the
+        target whose breakpoints are listed after breakpoint events and
+        profile the profile data read.
+    """
+    broadcaster_class = event.GetBroadcasterClass()
+    entry = {
+        't': round(time.time() - self.start, 6),
+        'c': broadcaster_class,
+        'e': event.GetType(),
+        'd': to_text(lldbutil.get_description(event)),
+      }
+
+    if lldb.SBProcess.EventIsProcessEvent(event):
+      # only state changes carry the threads: output and profile events can
+      # come by the thousand
+      if event.GetType() & lldb.SBProcess.eBroadcastBitStateChanged:
+        entry['p'] = process_record(lldb.SBProcess.GetProcessFromEvent(event))
+        entry['s'] = lldb.SBProcess.GetStateFromEvent(event)
+        entry['r'] = lldb.SBProcess.GetRestartedFromEvent(event)
+    elif lldb.SBThread.EventIsThreadEvent(event):
+      entry['th'] = thread_record(lldb.SBThread.GetThreadFromEvent(event))
+    elif lldb.SBBreakpoint.EventIsBreakpointEvent(event):
+      entry['bp'] = breakpoint_record(lldb.SBBreakpoint.GetBreakpointFromEvent(event))
+      entry['bt'] = lldb.SBBreakpoint.GetBreakpointEventTypeFromEvent(event)
+      n = lldb.SBBreakpoint.GetNumBreakpointLocationsFromEvent(event)
+      entry['el'] = [location_record(
+          lldb.SBBreakpoint.GetBreakpointLocationAtIndexFromEvent(event, i))
+          for i in range(n)]
+      if target is not None and target.IsValid():
+        entry['bps'] = [breakpoint_record(target.GetBreakpointAtIndex(i))
+                        for i in range(target.GetNumBreakpoints())]
+    elif broadcaster_class == lldb.SBTarget.GetBroadcasterClassName() and \
+        event.GetType() & modules.module_events:
+      event_target = lldb.SBTarget.GetTargetFromEvent(event)
+      entry['m'] = []
+      for i in range(lldb.SBTarget.GetNumModulesFromEvent(event)):
+        info = modules.module_info(
+            lldb.SBTarget.GetModuleAtIndexFromEvent(i, event), event_target)
+        entry['m'].append([to_text(info.path), to_text(info.uuid),
+                           info.load_address, to_text(info.symbols)])
+
+    if chunks:
+      # latin-1 round-trips arbitrary bytes through JSON
+      entry['out'] = [[data.decode('latin-1'), is_error] for data, is_error in chunks]
+    if profile:
+      entry['prof'] = profile.decode('latin-1')
+
+    line = json.dumps(entry, separators = (',', ':'))
+    with self.lock:
+      self.file.write(line + '\n')
+      self.file.flush()
+
+  def close(self):
+    self.file.close()
+
+def make_frame(record):
+  if record is None:
+    return lldb.SBFrame(valid = False)
+  directory, filename, line, function = record[:4]
+  index, pc = record[4:6] if len(record) >= 6 else (0, 0)
+  return lldb.SBFrame(lldb.SBLineEntry(lldb.SBFileSpec(directory, filename), line),
+                      function, pc, index = index)
+
+def make_thread(record):
+  tid, index_id, name, stop_reason, frame = record
+  return lldb.SBThread(tid = tid, index_id = index_id, name = name,
+                       stop_reason = stop_reason, frames = [make_frame(frame)])
+
+def make_breakpoint(record):
+  id, internal, enabled, desc, locations = record
+  return lldb.SBBreakpoint(id, enabled, internal, desc,
+                           [lldb.SBBreakpointLocation(*l) for l in locations])
+
+def make_module(record):
+  path, uuid, load_address, symbols = record
+  directory, filename = os.path.split(path)
+  symbol_file = None
+  if symbols is not None:
+    symbol_file = lldb.SBFileSpec(directory, symbols)
+  return lldb.SBModule(lldb.SBFileSpec(directory, filename), uuid,
+                       load_address, symbol_file)
+
+class ReplayDriver(debuggerdriver.DebuggerDriver):
+  """ Stands in for the driver of a live debugger: replays the events of a
+  log written by EventRecorder into the event queue, as stand-in objects
+  (see fakelldb.py) carrying the recorded state.
+
+  Events are replayed with their recorded timing divided by speed, or as
+  fast as possible if speed is 0. Commands are not available.
+  """
+  def __init__(self, event_queue, path, speed = 1.0):
+    self.path = path
+    self.speed = speed
+    debuggerdriver.DebuggerDriver.__init__(self, None, event_queue)
+
+  def initialize(self, debugger):
+    self.done = False
+    self.debugger = None
+    self.interpreter = lldb.SBCommandInterpreter()
+    self.target = lldb.SBTarget(valid = False)
+    self.replayed = 0
+    # (process, {tid: position in its threads})
+    self.thread_positions = (None, {})
+
+  def getPrompt(self):
+    return '(replay) '
+
+  def getCommandInterpreter(self):
+    return self.interpreter
+
+  def getSourceManager(self):
+    return None
+
+  def getTarget(self):
+    return self.target
+
+  def setSize(self, width, height):
+    pass
+
+  def createTarget(self, target_image, args=None):
+    pass
+
+  def attachProcess(self, pid):
+    pass
+
+  def loadCore(self, corefile):
+    pass
+
+  def cancelCommand(self, future):
+    with future.lock:
+      future.cancelled = True
+
+  def terminate(self):
+    sys.exit(0)
+
+  def make_event(self, record):
+    """ Returns the SBEvent for a record, updating the target as it goes. """
+    target = self.target
+    if record.get('p') is not None:
+      p = record['p']
+      target.valid = True
+      target.desc = p['target']
+      process = lldb.SBProcess(target, p['pid'], p['state'], p['exit'],
+                               [make_thread(t) for t in p['threads']], p['sel'],
+                               stop_id = p.get('stop', 0))
+      target.process = process
+    process = target.process
+    if record.get('bps') is not None:
+      target.valid = True
+      target.breakpoints = [make_breakpoint(b) for b in record['bps']]
+
+    event = lldb.SBEvent(record['c'], record['e'], record.get('d') or '')
+    if record['c'] == lldb.SBProcess.GetBroadcasterClassName():
+      event.process = process
+    if 's' in record:
+      event.state = record['s']
+      event.restarted = record['r']
+    if 'th' in record:
+      event.thread = self.update_thread(make_thread(record['th']))
+    if 'm' in record:
+      event.target = target
+      event.modules = [make_module(m) for m in record['m']]
+    if 'bp' in record:
+      event.breakpoint = make_breakpoint(record['bp'])
+      event.breakpoint_event_type = record['bt']
+      event.locations = [lldb.SBBreakpointLocation(*l) for l in record['el']]
+    return event
+
+  def update_thread(self, thread):
+    """ Puts thread in place of the one with its tid in the process of the
+        last state change.
+    """
+    process = self.target.process
+    if process is None:
+      return thread
+    if self.thread_positions[0] is not process:
+      positions = dict((t.GetThreadID(), i) for i, t in enumerate(process.threads))
+      self.thread_positions = (process, positions)
+    positions = self.thread_positions[1]
+    thread.process = process
+    tid = thread.GetThreadID()
+    if tid in positions:
+      process.threads[positions[tid]] = thread
+    else:
+      positions[tid] = len(process.threads)
+      process.threads.append(thread)
+    return thread
+
+  def eventLoop(self):
+    start = time.time()
+    with open(self.path) as f:
+      for line in f:
+        if self.isDone():
+          break
+        line = line.strip()
+        if len(line) == 0:
+          continue
+        record = json.loads(line)
+        if self.speed > 0:
+          delay = start + record['t'] / self.speed - time.time()
+          if delay > 0:
+            time.sleep(delay)
+        event = self.make_event(record)
+        for data, is_error in record.get('out', []):
+          self.process_output.append(data.encode('latin-1'), is_error)
+        if 'prof' in record:
+          self.profile.add_data(record['prof'].encode('latin-1'))
+        self.dispatchEvent(event)
+        self.replayed += 1
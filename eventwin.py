@@ -16,10 +16,12 @@ class EventWalker(urwid.ListWalker):
     self.focus = 0
 
   def add(self, event):
-    text = urwid.Text('* ' + lldbutil.get_description(event))
-    self.events.append(text)
+    self.add_events([event])
+
+  def add_events(self, events):
+    for event in events:
+      self.events.append(urwid.Text('* ' + lldbutil.get_description(event)))
     self.set_focus(len(self.events)-1)
-    return
 
   def get_focus(self):
     return self._get_at_pos(self.focus)
@@ -52,3 +54,6 @@ class EventWin(urwid.ListBox):
     self.walker.add(event)
     return
 
+  def handle_lldb_events(self, events):
+    self.walker.add_events(events)
+
@@ -0,0 +1,613 @@
+##===-- fakelldb.py ------------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+"""
+Stand-in for the parts of the lldb module that lui uses, backed by plain
+data instead of a live debugger. It is installed as the lldb module to
+replay recorded sessions (see eventlog.py) and to run the benchmarks.
+
+Objects are built from the state they should report; events carry the
+process, thread or breakpoint they refer to.
+"""
+
+UINT32_MAX = 0xffffffff
+LLDB_INVALID_ADDRESS = 0xffffffffffffffff
+
+eStateInvalid   = 0
+eStateUnloaded  = 1
+eStateConnected = 2
+eStateAttaching = 3
+eStateLaunching = 4
+eStateStopped   = 5
+eStateRunning   = 6
+eStateStepping  = 7
+eStateCrashed   = 8
+eStateDetached  = 9
+eStateExited    = 10
+eStateSuspended = 11
+
+eStopReasonInvalid       = 0
+eStopReasonNone          = 1
+eStopReasonTrace         = 2
+eStopReasonBreakpoint    = 3
+eStopReasonWatchpoint    = 4
+eStopReasonSignal        = 5
+eStopReasonException     = 6
+eStopReasonExec          = 7
+eStopReasonPlanComplete  = 8
+eStopReasonThreadExiting = 9
+
+eBreakpointEventTypeInvalidType       = 1 << 0
+eBreakpointEventTypeAdded             = 1 << 1
+eBreakpointEventTypeRemoved           = 1 << 2
+eBreakpointEventTypeLocationsAdded    = 1 << 3
+eBreakpointEventTypeLocationsRemoved  = 1 << 4
+eBreakpointEventTypeLocationsResolved = 1 << 5
+eBreakpointEventTypeEnabled           = 1 << 6
+eBreakpointEventTypeDisabled          = 1 << 7
+eBreakpointEventTypeCommandChanged    = 1 << 8
+eBreakpointEventTypeConditionChanged  = 1 << 9
+eBreakpointEventTypeIgnoreChanged     = 1 << 10
+eBreakpointEventTypeThreadChanged     = 1 << 11
+
+eDescriptionLevelBrief   = 0
+eDescriptionLevelFull    = 1
+eDescriptionLevelVerbose = 2
+
+class SBStream(object):
+  def __init__(self):
+    self.data = []
+
+  def Print(self, s):
+    self.data.append(s)
+
+  def GetData(self):
+    return ''.join(self.data)
+
+class SBFileSpec(object):
+  def __init__(self, directory = None, filename = None):
+    self.directory = directory
+    self.filename = filename
+
+  def IsValid(self):
+    return self.filename is not None
+
+  def GetDirectory(self):
+    return self.directory
+
+  def GetFilename(self):
+    return self.filename
+
+class SBAddress(object):
+  def __init__(self, load_address = None):
+    self.load_address = load_address
+
+  def GetLoadAddress(self, target):
+    if self.load_address is None:
+      return LLDB_INVALID_ADDRESS
+    return self.load_address
+
+class SBModule(object):
+  def __init__(self, filespec = None, uuid = None, load_address = None,
+               symbol_file = None):
+    self.filespec = filespec or SBFileSpec()
+    self.uuid = uuid
+    self.header = SBAddress(load_address)
+    self.symbol_file = symbol_file or SBFileSpec()
+
+  def IsValid(self):
+    return True
+
+  def GetFileSpec(self):
+    return self.filespec
+
+  def GetUUIDString(self):
+    return self.uuid
+
+  def GetObjectFileHeaderAddress(self):
+    return self.header
+
+  def GetSymbolFileSpec(self):
+    return self.symbol_file
+
+class SBLineEntry(object):
+  def __init__(self, filespec = None, line = 0):
+    self.filespec = filespec or SBFileSpec()
+    self.line = line
+
+  def IsValid(self):
+    return self.filespec.IsValid()
+
+  def GetFileSpec(self):
+    return self.filespec
+
+  def GetLine(self):
+    return self.line
+
+class SBValue(object):
+  def __init__(self, name = None, type_name = None, value = None,
+               summary = None, children = (), valid = True):
+    self.name = name
+    self.type_name = type_name
+    self.value = value
+    self.summary = summary
+    self.children = list(children)
+    self.valid = valid
+
+  def IsValid(self):
+    return self.valid
+
+  def GetName(self):
+    return self.name
+
+  def GetTypeName(self):
+    return self.type_name
+
+  def GetValue(self):
+    return self.value
+
+  def GetSummary(self):
+    return self.summary
+
+  def GetNumChildren(self, max = None):
+    if max is None:
+      return len(self.children)
+    return min(len(self.children), max)
+
+  def MightHaveChildren(self):
+    return len(self.children) > 0
+
+  def GetChildAtIndex(self, i):
+    if i < len(self.children):
+      return self.children[i]
+    return SBValue(valid = False)
+
+  def __iter__(self):
+    return iter(self.children)
+
+class SBValueList(object):
+  def __init__(self, values = ()):
+    self.values = list(values)
+
+  def IsValid(self):
+    return True
+
+  def GetSize(self):
+    return len(self.values)
+
+  def GetValueAtIndex(self, i):
+    if i < len(self.values):
+      return self.values[i]
+    return SBValue(valid = False)
+
+  def __iter__(self):
+    return iter(self.values)
+
+class SBFrame(object):
+  def __init__(self, line_entry = None, function = None, pc = 0, valid = True,
+               index = 0, variables = (), registers = ()):
+    self.line_entry = line_entry or SBLineEntry()
+    self.function = function
+    self.pc = pc
+    self.valid = valid
+    self.index = index
+    self.variables = list(variables)
+    self.registers = list(registers)
+
+  def IsValid(self):
+    return self.valid
+
+  def GetLineEntry(self):
+    return self.line_entry
+
+  def GetFunctionName(self):
+    return self.function
+
+  def GetPC(self):
+    return self.pc
+
+  def GetFrameID(self):
+    return self.index
+
+  def GetVariables(self, arguments, locals, statics, in_scope_only):
+    return SBValueList(self.variables)
+
+  def GetRegisters(self):
+    return SBValueList(self.registers)
+
+class SBEvent(object):
+  def __init__(self, broadcaster_class = '', event_type = 0, desc = '',
+               process = None, thread = None, state = eStateInvalid,
+               restarted = False, breakpoint = None,
+               breakpoint_event_type = eBreakpointEventTypeInvalidType,
+               locations = (), target = None, modules = ()):
+    self.broadcaster_class = broadcaster_class
+    self.event_type = event_type
+    self.desc = desc
+    self.process = process
+    self.thread = thread
+    self.state = state
+    self.restarted = restarted
+    self.breakpoint = breakpoint
+    self.breakpoint_event_type = breakpoint_event_type
+    self.locations = list(locations)
+    self.target = target
+    self.modules = list(modules)
+
+  def IsValid(self):
+    return True
+
+  def GetBroadcasterClass(self):
+    return self.broadcaster_class
+
+  def GetType(self):
+    return self.event_type
+
+  def GetDescription(self, stream):
+    stream.Print(self.desc)
+    return True
+
+class SBThread(object):
+  eBroadcastBitStackChanged         = 1 << 0
+  eBroadcastBitThreadSuspended      = 1 << 1
+  eBroadcastBitThreadResumed        = 1 << 2
+  eBroadcastBitSelectedFrameChanged = 1 << 3
+  eBroadcastBitThreadSelected       = 1 << 4
+
+  def __init__(self, process = None, tid = 0, index_id = 0, name = None,
+               stop_reason = eStopReasonNone, frames = (), valid = True):
+    self.process = process
+    self.tid = tid
+    self.index_id = index_id
+    self.name = name
+    self.stop_reason = stop_reason
+    self.frames = list(frames)
+    self.valid = valid
+
+  def IsValid(self):
+    return self.valid
+
+  def GetThreadID(self):
+    return self.tid
+
+  def GetIndexID(self):
+    return self.index_id
+
+  def GetName(self):
+    return self.name
+
+  def GetStopReason(self):
+    return self.stop_reason
+
+  def GetProcess(self):
+    return self.process or SBProcess(valid = False)
+
+  def GetNumFrames(self):
+    return len(self.frames)
+
+  def GetFrameAtIndex(self, i):
+    if i < len(self.frames):
+      return self.frames[i]
+    return SBFrame(valid = False)
+
+  def GetSelectedFrame(self):
+    return self.GetFrameAtIndex(0)
+
+  @staticmethod
+  def GetBroadcasterClassName():
+    return 'lldb.thread'
+
+  @staticmethod
+  def EventIsThreadEvent(event):
+    return event.broadcaster_class == SBThread.GetBroadcasterClassName()
+
+  @staticmethod
+  def GetThreadFromEvent(event):
+    return event.thread or SBThread(valid = False)
+
+class SBProcess(object):
+  eBroadcastBitStateChanged   = 1 << 0
+  eBroadcastBitInterrupt      = 1 << 1
+  eBroadcastBitSTDOUT         = 1 << 2
+  eBroadcastBitSTDERR         = 1 << 3
+  eBroadcastBitProfileData    = 1 << 4
+
+  def __init__(self, target = None, pid = 0, state = eStateInvalid,
+               exit_status = 0, threads = (), selected_thread = 0,
+               valid = True, stop_id = 0, memory = ()):
+    self.target = target
+    self.stop_id = stop_id
+    # [(address, data)]
+    self.memory = list(memory)
+    self.pid = pid
+    self.state = state
+    self.exit_status = exit_status
+    self.threads = list(threads)
+    self.selected_thread = selected_thread
+    self.valid = valid
+    for thread in self.threads:
+      thread.process = self
+
+  def IsValid(self):
+    return self.valid
+
+  def GetState(self):
+    return self.state
+
+  def GetProcessID(self):
+    return self.pid
+
+  def GetExitStatus(self):
+    return self.exit_status
+
+  def GetStopID(self):
+    return self.stop_id
+
+  def GetTarget(self):
+    return self.target or SBTarget(valid = False)
+
+  def GetNumThreads(self):
+    return len(self.threads)
+
+  def GetThreadAtIndex(self, i):
+    if i < len(self.threads):
+      return self.threads[i]
+    return SBThread(valid = False)
+
+  def GetSelectedThread(self):
+    return self.GetThreadAtIndex(self.selected_thread)
+
+  def ReadMemory(self, address, size, error):
+    for start, data in self.memory:
+      if start <= address < start + len(data):
+        return data[address - start:address - start + size]
+    error.SetErrorString('memory read failed for 0x%x' % address)
+    return None
+
+  def GetThreadByID(self, tid):
+    for thread in self.threads:
+      if thread.tid == tid:
+        return thread
+    return SBThread(valid = False)
+
+  def __iter__(self):
+    return iter(self.threads)
+
+  def GetSTDOUT(self, size):
+    return ''
+
+  def GetSTDERR(self, size):
+    return ''
+
+  def GetAsyncProfileData(self, size):
+    return ''
+
+  def SendAsyncInterrupt(self):
+    pass
+
+  @staticmethod
+  def GetBroadcasterClassName():
+    return 'lldb.process'
+
+  @staticmethod
+  def EventIsProcessEvent(event):
+    return event.broadcaster_class == SBProcess.GetBroadcasterClassName()
+
+  @staticmethod
+  def GetProcessFromEvent(event):
+    return event.process or SBProcess(valid = False)
+
+  @staticmethod
+  def GetStateFromEvent(event):
+    return event.state
+
+  @staticmethod
+  def GetRestartedFromEvent(event):
+    return event.restarted
+
+class SBBreakpointLocation(object):
+  def __init__(self, id = 0, desc = ''):
+    self.id = id
+    self.desc = desc
+
+  def GetID(self):
+    return self.id
+
+  def GetDescription(self, stream, level = eDescriptionLevelBrief):
+    stream.Print(self.desc)
+    return True
+
+class SBBreakpoint(object):
+  def __init__(self, id = 0, enabled = True, internal = False, desc = '',
+               locations = ()):
+    self.id = id
+    self.enabled = enabled
+    self.internal = internal
+    self.desc = desc
+    self.locations = list(locations)
+
+  def IsValid(self):
+    return True
+
+  def GetID(self):
+    return self.id
+
+  def IsEnabled(self):
+    return self.enabled
+
+  def IsInternal(self):
+    return self.internal
+
+  def GetNumLocations(self):
+    return len(self.locations)
+
+  def GetLocationAtIndex(self, i):
+    return self.locations[i]
+
+  def __iter__(self):
+    return iter(self.locations)
+
+  def GetDescription(self, stream):
+    stream.Print(self.desc)
+    return True
+
+  @staticmethod
+  def EventIsBreakpointEvent(event):
+    return event.breakpoint is not None
+
+  @staticmethod
+  def GetBreakpointFromEvent(event):
+    return event.breakpoint
+
+  @staticmethod
+  def GetBreakpointEventTypeFromEvent(event):
+    return event.breakpoint_event_type
+
+  @staticmethod
+  def GetNumBreakpointLocationsFromEvent(event):
+    return len(event.locations)
+
+  @staticmethod
+  def GetBreakpointLocationAtIndexFromEvent(event, i):
+    return event.locations[i]
+
+class SBWatchpoint(object):
+  pass
+
+class SBTarget(object):
+  eBroadcastBitBreakpointChanged  = 1 << 0
+  eBroadcastBitModulesLoaded      = 1 << 1
+  eBroadcastBitModulesUnloaded    = 1 << 2
+  eBroadcastBitWatchpointChanged  = 1 << 3
+  eBroadcastBitSymbolsLoaded      = 1 << 4
+
+  def __init__(self, desc = '', breakpoints = (), process = None,
+               valid = True, triple = None, modules = ()):
+    self.desc = desc
+    self.breakpoints = list(breakpoints)
+    self.modules = list(modules)
+    self.process = process
+    self.valid = valid
+    self.triple = triple
+
+  def IsValid(self):
+    return self.valid
+
+  def GetNumBreakpoints(self):
+    return len(self.breakpoints)
+
+  def GetBreakpointAtIndex(self, i):
+    return self.breakpoints[i]
+
+  def GetProcess(self):
+    return self.process or SBProcess(valid = False)
+
+  def GetNumModules(self):
+    return len(self.modules)
+
+  def GetModuleAtIndex(self, i):
+    return self.modules[i]
+
+  def GetTriple(self):
+    return self.triple
+
+  def GetDescription(self, stream, level = eDescriptionLevelBrief):
+    stream.Print(self.desc)
+    return True
+
+  @staticmethod
+  def GetBroadcasterClassName():
+    return 'lldb.target'
+
+  @staticmethod
+  def GetTargetFromEvent(event):
+    return event.target or SBTarget(valid = False)
+
+  @staticmethod
+  def GetNumModulesFromEvent(event):
+    return len(event.modules)
+
+  @staticmethod
+  def GetModuleAtIndexFromEvent(i, event):
+    return event.modules[i]
+
+class SBStringList(object):
+  def __init__(self):
+    self.strings = []
+
+  def AppendString(self, s):
+    self.strings.append(s)
+
+  def GetSize(self):
+    return len(self.strings)
+
+  def GetStringAtIndex(self, i):
+    return self.strings[i]
+
+  def __iter__(self):
+    return iter(self.strings)
+
+class SBError(object):
+  def __init__(self):
+    self.error = None
+
+  def Success(self):
+    return self.error is None
+
+  def Fail(self):
+    return self.error is not None
+
+  def GetCString(self):
+    return self.error
+
+  def SetErrorString(self, msg):
+    self.error = msg
+
+class SBCommandReturnObject(object):
+  def __init__(self):
+    self.output = ''
+    self.error = ''
+
+  def Succeeded(self):
+    return self.error == ''
+
+  def GetOutput(self):
+    return self.output
+
+  def GetError(self):
+    return self.error
+
+  def AppendMessage(self, msg):
+    self.output += msg + '\n'
+
+  def SetError(self, msg):
+    self.error = msg
+
+  def SetImmediateOutputFile(self, f):
+    pass
+
+  def SetImmediateErrorFile(self, f):
+    pass
+
+class SBCommandInterpreter(object):
+  eBroadcastBitThreadShouldExit         = 1 << 0
+  eBroadcastBitResetPrompt              = 1 << 1
+  eBroadcastBitQuitCommandReceived      = 1 << 2
+  eBroadcastBitAsynchronousOutputData   = 1 << 3
+  eBroadcastBitAsynchronousErrorData    = 1 << 4
+
+  def HandleCommand(self, cmd, ret):
+    ret.SetError('commands are not available without a live debugger')
+
+  def HandleCompletion(self, line, cursor, match_start, max_matches, matches):
+    return 0
+
+  @staticmethod
+  def GetBroadcasterClass():
+    return 'lldb.commandInterpreter'
@@ -0,0 +1,174 @@
+##===-- highlight.py -----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import Queue
+import threading
+from collections import OrderedDict
+
+try:
+  from pygments.lexers import get_lexer_for_filename
+  from pygments.token import Token
+  from pygments.util import ClassNotFound
+except ImportError:
+  get_lexer_for_filename = None
+
+# palette attribute used for each token type (and its sub-types)
+token_attrs = None
+if get_lexer_for_filename is not None:
+  token_attrs = {
+      Token.Keyword            : 'keyword',
+      Token.Name.Builtin       : 'keyword',
+      Token.Name.Function      : 'function',
+      Token.Name.Class         : 'function',
+      Token.Literal.String     : 'string',
+      Token.Literal.Number     : 'number',
+      Token.Comment            : 'comment',
+      Token.Comment.Preproc    : 'preproc',
+      Token.Comment.PreprocFile: 'string',
+    }
+
+class Highlighter(object):
+  """ Lexes source buffers with pygments on a worker thread.
+
+  Results are stored in SourceBuffer.spans as a tuple of (attr, length)
+  pairs per line. Lines around the one requested are lexed first, so that
+  the visible part of a file is coloured quickly; small files are then
+  lexed as a whole, which replaces the approximate window results.
+  spans_ready(buffer, lines) is called on the UI thread as results arrive.
+  """
+  window_before = 50
+  window_after = 150
+  # files bigger than this are only ever highlighted window by window
+  full_limit = 2 * 1024 * 1024
+  batch_lines = 2000
+  lexer_cache_size = 64
+
+  def __init__(self, event_queue, spans_ready):
+    self.event_queue = event_queue
+    self.spans_ready = spans_ready
+    self.requests = Queue.Queue()
+    # path -> lexer, for the most recent paths
+    self.lexers = OrderedDict()
+    self.attrs = {}
+    self.thread = None
+
+  def available(self):
+    return get_lexer_for_filename is not None
+
+  def request(self, buffer, lineno):
+    """ Asks for the lines around lineno of buffer to be highlighted. """
+    if not self.available() or buffer.highlighted or buffer.path is None:
+      return
+    if self.thread is None:
+      self.thread = threading.Thread(target = self.worker)
+      self.thread.daemon = True
+      self.thread.start()
+    self.requests.put((buffer, lineno))
+
+  def worker(self):
+    while True:
+      buffer, lineno = self.requests.get()
+      # only the most recent request matters
+      while not self.requests.empty():
+        buffer, lineno = self.requests.get()
+      if buffer.highlighted or buffer.lexed:
+        continue
+      lexer = self.get_lexer(buffer.path)
+      if lexer is None:
+        buffer.highlighted = True
+        continue
+
+      if lineno not in buffer.spans and not self.in_flight(buffer, lineno):
+        first = max(0, lineno - self.window_before)
+        window = (first, lineno + self.window_after)
+        buffer.windows.add(window)
+        lines = []
+        pos = first
+        while pos < window[1] and buffer.has_line(pos):
+          lines.append(buffer.line(pos))
+          pos += 1
+        spans = dict(self.lex(lexer, '\n'.join(lines), first))
+        self.publish(buffer, spans, False, window)
+
+      if buffer.size <= self.full_limit and not buffer.stale():
+        try:
+          text = buffer.data[:].decode('utf-8', 'replace')
+        except ValueError:
+          # the map was closed meanwhile
+          continue
+        spans = {}
+        for lineno, line_spans in self.lex(lexer, text, 0):
+          spans[lineno] = line_spans
+          if len(spans) >= self.batch_lines:
+            self.publish(buffer, spans, False)
+            spans = {}
+        buffer.lexed = True
+        self.publish(buffer, spans, True)
+
+  def in_flight(self, buffer, lineno):
+    """ Returns True if lineno is in a window whose results are on their way
+    to the UI thread.
+    """
+    for first, end in list(buffer.windows):
+      if first <= lineno < end:
+        return True
+    return False
+
+  def publish(self, buffer, spans, complete, window = None):
+    def apply():
+      buffer.spans.update(spans)
+      buffer.windows.discard(window)
+      if complete:
+        buffer.highlighted = True
+      self.spans_ready(buffer, spans.keys())
+    self.event_queue.post(apply)
+
+  def get_lexer(self, path):
+    try:
+      lexer = self.lexers.pop(path)
+    except KeyError:
+      try:
+        lexer = get_lexer_for_filename(path, stripnl = False)
+      except ClassNotFound:
+        lexer = None
+    self.lexers[path] = lexer
+    while len(self.lexers) > self.lexer_cache_size:
+      self.lexers.popitem(last = False)
+    return lexer
+
+  def get_attr(self, ttype):
+    attr = self.attrs.get(ttype, False)
+    if attr is False:
+      t = ttype
+      while t not in token_attrs and t.parent is not None:
+        t = t.parent
+      attr = token_attrs.get(t)
+      self.attrs[ttype] = attr
+    return attr
+
+  def lex(self, lexer, text, first):
+    """ Yields (lineno, spans) for each line of text, which starts at first. """
+    lineno = first
+    spans = []
+    for ttype, value in lexer.get_tokens(text):
+      attr = self.get_attr(ttype)
+      parts = value.split('\n')
+      for i, part in enumerate(parts):
+        if i > 0:
+          yield lineno, tuple(spans)
+          lineno += 1
+          spans = []
+        if len(part) == 0:
+          continue
+        if len(spans) > 0 and spans[-1][0] == attr:
+          spans[-1] = (attr, spans[-1][1] + len(part))
+        else:
+          spans.append((attr, len(part)))
+    if len(spans) > 0:
+      yield lineno, tuple(spans)
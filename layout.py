@@ -1,8 +1,16 @@
 import urwid
+import backtracewin
 import breakwin
 import commandwin
 import eventwin
+import memorywin
+import modulewin
+import outputwin
+import profilewin
+import registerwin
 import sourcewin
+import threadwin
+import variablewin
 
 default_layout = """
 {
@@ -59,13 +67,25 @@ class LayoutBuilder:
     if obj == 'source':
       return create(sourcewin.SourceWin(self.event_queue, self.driver), 'Source')
     elif obj == 'command':
-      return create(commandwin.CommandWin(self.driver), 'Commands')
+      return create(commandwin.CommandWin(self.event_queue, self.driver), 'Commands')
     elif obj == 'breakpoints':
       return create(breakwin.BreakWin(self.event_queue, self.driver), 'Breakpoints')
     elif obj == 'threads':
-      return create(urwid.SolidFill(u' '), 'Threads')
+      return create(threadwin.ThreadWin(self.event_queue, self.driver), 'Threads')
     elif obj == 'backtrace':
-      return create(urwid.SolidFill(u' '), 'Backtrace')
+      return create(backtracewin.BacktraceWin(self.event_queue, self.driver), 'Backtrace')
+    elif obj == 'variables':
+      return create(variablewin.VariableWin(self.event_queue, self.driver), 'Variables')
+    elif obj == 'registers':
+      return create(registerwin.RegisterWin(self.event_queue, self.driver), 'Registers')
+    elif obj == 'memory':
+      return create(memorywin.MemoryWin(self.event_queue, self.driver), 'Memory')
+    elif obj == 'modules':
+      return create(modulewin.ModuleWin(self.event_queue, self.driver), 'Modules')
+    elif obj == 'profile':
+      return create(profilewin.ProfileWin(self.event_queue, self.driver), 'Profile')
+    elif obj == 'output':
+      return create(outputwin.OutputWin(self.event_queue, self.driver), 'Process Output')
     elif obj == 'events':
       return create(eventwin.EventWin(self.event_queue), 'LLDB Events')
     elif obj == 'terminal':
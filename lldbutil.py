@@ -188,6 +188,8 @@ def stop_reason_to_str(enum):
         return "signal"
     elif enum == lldb.eStopReasonException:
         return "exception"
+    elif enum == lldb.eStopReasonExec:
+        return "exec"
     elif enum == lldb.eStopReasonPlanComplete:
         return "plancomplete"
     elif enum == lldb.eStopReasonThreadExiting:
@@ -278,11 +280,16 @@ def sort_stopped_threads(process,
                          watchpoint_threads = None,
                          signal_threads = None,
                          exiting_threads = None,
-                         other_threads = None):
+                         other_threads = None,
+                         stop_reason = None):
     """ Fills array *_threads with threads stopped for the corresponding stop
         reason.
+
+        process may be any sequence of threads; stop_reason(thread) returns
+        the stop reason of one of them, thread.GetStopReason() by default.
     """
     for lst in [breakpoint_threads,
+                crashed_threads,
                 watchpoint_threads,
                 signal_threads,
                 exiting_threads,
@@ -290,18 +297,21 @@ def sort_stopped_threads(process,
         if lst is not None:
             lst[:] = []
 
+    lists = {lldb.eStopReasonBreakpoint: breakpoint_threads,
+             lldb.eStopReasonException: crashed_threads,
+             lldb.eStopReasonWatchpoint: watchpoint_threads,
+             lldb.eStopReasonSignal: signal_threads,
+             lldb.eStopReasonThreadExiting: exiting_threads}
     for thread in process:
-        dispatched = False
-        for (reason, list) in [(lldb.eStopReasonBreakpoint, breakpoint_threads),
-                               (lldb.eStopReasonException, crashed_threads),
-                               (lldb.eStopReasonWatchpoint, watchpoint_threads),
-                               (lldb.eStopReasonSignal, signal_threads),
-                               (lldb.eStopReasonThreadExiting, exiting_threads),
-                               (None, other_threads)]:
-            if not dispatched and list is not None:
-                if thread.GetStopReason() == reason or reason is None:
-                    list.append(thread)
-                    dispatched = True
+        if stop_reason is None:
+            reason = thread.GetStopReason()
+        else:
+            reason = stop_reason(thread)
+        list = lists.get(reason)
+        if list is None:
+            list = other_threads
+        if list is not None:
+            list.append(thread)
 
 # ==================================================
 # Utility functions for setting breakpoints
@@ -8,31 +8,53 @@
 ##
 ##===----------------------------------------------------------------------===##
 
+import sys
+if any(arg == '--replay' or arg.startswith('--replay=') for arg in sys.argv[1:]):
+  # replaying a recorded session does not need liblldb
+  import fakelldb
+  sys.modules['lldb'] = fakelldb
+
 import lldb
 import lldbutil
 
 import argparse
 import os
 import signal
-import sys
+import threading
+import time
+import collections
+import heapq
 
 import Queue
 
 import debuggerdriver
+import eventlog
 
 import statuswin
 import layout
+import sourcepath
+import timing
+import variables
 import urwid
 
 event_queue = None
 debug = False
 
 def test_a_out(driver):
-  driver.handleCommand('target create a.out')
-  driver.handleCommand('b main')
-  driver.handleCommand('run')
-
-def handle_args(driver, argv):
+  driver.handleCommandAsync('target create a.out')
+  driver.handleCommandAsync('b main')
+  driver.handleCommandAsync('run')
+
+def positive_int(text):
+  try:
+    n = int(text)
+  except ValueError:
+    n = 0
+  if n < 1:
+    raise argparse.ArgumentTypeError("'%s' is not a number of at least 1" % text)
+  return n
+
+def parse_args(argv):
   parser = argparse.ArgumentParser(description='LLDB Terminal User Interface')
   parser.add_argument("-p", "--attach", dest="pid", type=int,
                       help="Attach to specified Process ID")
@@ -44,11 +66,28 @@ def handle_args(driver, argv):
                       help="Load layout from file")
   parser.add_argument("--default_layout", action='store_true',
                       help="Dump default layout")
+  parser.add_argument("--source-map", dest="source_map", action='append',
+                      default=[], metavar="OLD=NEW",
+                      help="Look for sources under prefix OLD in NEW instead")
+  parser.add_argument("--max-children", dest="max_children", type=positive_int,
+                      metavar="N",
+                      help="Read at most N children of a variable at a time")
+  parser.add_argument("--max-depth", dest="max_depth", type=positive_int,
+                      metavar="N",
+                      help="Do not expand variables nested deeper than N")
+  parser.add_argument("--record", metavar="FILE",
+                      help="Record the debugger events to FILE")
+  parser.add_argument("--replay", metavar="FILE",
+                      help="Replay the events recorded in FILE instead of debugging")
+  parser.add_argument("--replay-speed", dest="replay_speed", type=float,
+                      default=1.0, metavar="FACTOR",
+                      help="Replay FACTOR times faster than recorded (0 for no delays)")
   parser.add_argument('target', nargs='*',
                       help="debug target")
 
-  args = parser.parse_args()
+  return parser.parse_args(argv[1:])
 
+def handle_args(driver, args):
   if args.default_layout:
     print layout.default_layout
     sys.exit(0)
@@ -59,9 +98,33 @@ def handle_args(driver, argv):
   else:
     layout.load_layout()
 
+  # command line rules take precedence over the ones in the layout
+  for rule in args.source_map:
+    if '=' not in rule:
+      raise Exception("Invalid source map '%s', expected OLD=NEW" % rule)
+    old, new = rule.split('=', 1)
+    sourcepath.add_source_map(old, new)
+  for old, new in layout.loaded_layout.get('source-map', []):
+    sourcepath.add_source_map(old, new)
+
+  for key in ['max-children', 'max-depth']:
+    n = layout.loaded_layout.get(key)
+    if n is not None and (not isinstance(n, int) or n < 1):
+      raise Exception("Invalid %s '%s' in layout, expected at least 1" % (key, n))
+  variables.max_children = layout.loaded_layout.get('max-children',
+                                                    variables.max_children)
+  variables.max_depth = layout.loaded_layout.get('max-depth', variables.max_depth)
+  if args.max_children is not None:
+    variables.max_children = args.max_children
+  if args.max_depth is not None:
+    variables.max_depth = args.max_depth
+
   global debug
   debug = args.debug
 
+  if args.record is not None:
+    driver.recorder = eventlog.EventRecorder(args.record)
+
   if args.pid is not None:
     driver.attachProcess(args.pid)
   elif args.core is not None:
@@ -88,6 +151,14 @@ class LLDBView(urwid.WidgetWrap):
              ('running','light green','black', 'blink'),
              ('stopped','yellow',     'black', 'bold'),
              ('exited', 'dark red',   'black', 'bold'),
+             ('pc',     'black',      'yellow'),
+             ('keyword', 'light blue', 'black'),
+             ('function','light cyan', 'black'),
+             ('string',  'dark green', 'black'),
+             ('number',  'dark magenta','black'),
+             ('comment', 'dark cyan',  'black'),
+             ('preproc', 'brown',      'black'),
+             ('nosymbols','dark gray', 'black'),
              ]
 
   def __init__(self, event_queue, driver):
@@ -113,9 +184,11 @@ class LLDBUI:
 
   def unhandled_input(self, k):
     if k == 'f5':
-      self.driver.handleCommand('run')
+      self.driver.handleCommandAsync('run')
     if k == 'shift f5':
-      self.driver.handleCommand('continue')
+      self.driver.handleCommandAsync('continue')
+    if k == 'f2':
+      self.view.status_win.toggle_timings()
     if k == 'f10':
       self.driver.terminate()
       raise urwid.ExitMainLoop()
@@ -132,50 +205,261 @@ class LLDBUI:
     loop.run()
 
 class LLDBEventQueue:
-  def __init__(self):
-    self.queue = Queue.Queue()
+  """ Hands the events of the driver thread to the listeners on the UI thread.
+
+  Each time the UI wakes up, all pending events are drained as one batch and
+  redundant thread events are dropped from it. Every event is classified
+  once, by broadcaster class and event type, and each listener is handed
+  the events it subscribed to at once: listeners implementing
+  handle_lldb_events(events) get them as a batch, others get
+  handle_lldb_event(event) per event.
+
+  The UI is woken through the watch pipe at most once per drain: the first
+  put() or post() after a drain writes to the pipe, later ones only queue.
+  wakeups and events count the pipe writes and the queued events.
+
+  If max_events is given, the queue is bounded and each event is queued
+  according to the policy of its type (see get_policy). dropped and merged
+  count the events that never reached the UI.
+
+  If timings is set, the time of each listener call is added to it under
+  the listener's class name.
+  """
+  # thread events for which only the latest one per thread matters
+  coalesced_thread_events = lldb.SBThread.eBroadcastBitStackChanged \
+                          | lldb.SBThread.eBroadcastBitSelectedFrameChanged \
+                          | lldb.SBThread.eBroadcastBitThreadSelected
+
+  # number of profile data events kept while the UI is busy
+  profile_depth = 16
+
+  def __init__(self, max_events = None):
+    # (sequence number, entry), so that drain() keeps the order of put()
+    self.queue = collections.deque()
+    self.latest = collections.deque(maxlen = self.profile_depth)
+    # (class, type) of the 'merge' events currently queued
+    self.merging = set()
+    self.seq = 0
+    self.calls = Queue.Queue()
+    self.max_events = max_events
+    # (listener, subscriptions)
     self.listeners = []
+    # broadcaster class -> [(listener index, event type mask)]
+    self.routes = {}
+    self.drain_callbacks = []
+    # timing.Timings of the listener calls, if enabled
+    self.timings = None
     self.fd = -1
+    self.lock = threading.Lock()
+    self.pending = False
+    self.wakeups = 0
+    self.events = 0
+    self.coalesced = 0
+    self.dropped = 0
+    self.merged = 0
+
+    # broadcaster class -> [(event type mask, policy)]
+    self.policies = {
+        lldb.SBProcess.GetBroadcasterClassName(): [
+            (lldb.SBProcess.eBroadcastBitStateChanged
+           | lldb.SBProcess.eBroadcastBitInterrupt, 'keep'),
+            (lldb.SBProcess.eBroadcastBitSTDOUT
+           | lldb.SBProcess.eBroadcastBitSTDERR, 'merge'),
+            (lldb.SBProcess.eBroadcastBitProfileData, 'latest'),
+          ],
+        lldb.SBTarget.GetBroadcasterClassName(): [
+            (lldb.SBTarget.eBroadcastBitBreakpointChanged
+           | lldb.SBTarget.eBroadcastBitWatchpointChanged, 'keep'),
+          ],
+        lldb.SBCommandInterpreter.GetBroadcasterClass(): [
+            (0xffffffff, 'keep'),
+          ],
+      }
 
   def set_pipe(self, fd):
     self.fd = fd
-
-  def add_listener(self, listener):
-    self.listeners.append(listener)
+    if len(self.queue) > 0 or len(self.latest) > 0 or not self.calls.empty():
+      self.wakeup()
+
+  def add_listener(self, listener, subscriptions = None):
+    """ subscriptions maps broadcaster class names to the mask of event types
+        wanted from that class (None for all of them). A listener without
+        subscriptions gets every event.
+    """
+    self.listeners.append((listener, subscriptions))
+    self.routes = {}
+
+  def add_drain_callback(self, callback):
+    """ Calls callback() on the UI thread after each batch was dispatched. """
+    self.drain_callbacks.append(callback)
+
+  def get_routes(self, broadcaster_class):
+    routes = self.routes.get(broadcaster_class)
+    if routes is None:
+      routes = []
+      for i, (listener, subscriptions) in enumerate(self.listeners):
+        if subscriptions is None:
+          routes.append((i, None))
+        elif broadcaster_class in subscriptions:
+          routes.append((i, subscriptions[broadcaster_class]))
+      self.routes[broadcaster_class] = routes
+    return routes
+
+  def get_policy(self, broadcaster_class, event_type):
+    """ Returns what a bounded queue does with an event:
+          'keep'   always queued: state changes must never be lost
+          'merge'  only queued if no event of the same type is; used for
+                   STDOUT/STDERR, whose data is read from the process anyway
+          'latest' only the latest profile_depth events are kept
+          'drop'   dropped once max_events events are queued
+    """
+    for mask, policy in self.policies.get(broadcaster_class, []):
+      if event_type & mask:
+        return policy
+    return 'drop'
 
   def put(self, event):
-    self.queue.put(event)
-    if self.fd != -1:
-      os.write(self.fd, '1')
+    entry = (event, event.GetBroadcasterClass(), event.GetType())
+    with self.lock:
+      self.events += 1
+      self.seq += 1
+      policy = 'keep'
+      if self.max_events is not None:
+        policy = self.get_policy(entry[1], entry[2])
+      if policy == 'merge':
+        key = entry[1:]
+        if key in self.merging:
+          self.merged += 1
+          return
+        self.merging.add(key)
+      elif policy == 'latest':
+        if len(self.latest) == self.latest.maxlen:
+          self.dropped += 1
+        self.latest.append((self.seq, entry))
+      elif policy == 'drop' and len(self.queue) >= self.max_events:
+        self.dropped += 1
+        return
+      if policy != 'latest':
+        self.queue.append((self.seq, entry))
+    self.wakeup()
+
+  def post(self, callback):
+    """ Runs callback on the UI thread; may be called from any thread. """
+    self.calls.put(callback)
+    self.wakeup()
+
+  def wakeup(self):
+    with self.lock:
+      if self.pending or self.fd == -1:
+        return
+      self.pending = True
+      self.wakeups += 1
+    os.write(self.fd, '1')
+
+  def drain(self):
+    """ Returns the queued events as [(event, class, type)]. """
+    with self.lock:
+      # anything queued from now on needs another wakeup
+      self.pending = False
+      events = [entry for seq, entry in heapq.merge(self.queue, self.latest)]
+      self.queue.clear()
+      self.latest.clear()
+      self.merging.clear()
+    return events
+
+  def coalesce(self, events):
+    """ Keeps only the last of the events of the same type for the same thread. """
+    thread_class = lldb.SBThread.GetBroadcasterClassName()
+    keys = []
+    latest = {}
+    for i, (event, broadcaster_class, event_type) in enumerate(events):
+      key = None
+      if broadcaster_class == thread_class and \
+          event_type & self.coalesced_thread_events:
+        thread = lldb.SBThread.GetThreadFromEvent(event)
+        key = (event_type, thread.GetThreadID())
+        latest[key] = i
+      keys.append(key)
+    if len(latest) == 0:
+      return events
+
+    batch = [e for i, e in enumerate(events)
+             if keys[i] is None or latest[keys[i]] == i]
+    self.coalesced += len(events) - len(batch)
+    return batch
+
+  def dispatch_timed(self, listener, batch):
+    name = listener.__class__.__name__
+    if hasattr(listener, 'handle_lldb_events'):
+      start = time.time()
+      listener.handle_lldb_events(batch)
+      self.timings.add(name, time.time() - start)
+    else:
+      for event in batch:
+        start = time.time()
+        listener.handle_lldb_event(event)
+        self.timings.add(name, time.time() - start)
 
   def __call__(self, data):
-    while not self.queue.empty():
-      event = self.queue.get()
-      for listener in self.listeners:
-        listener.handle_lldb_event(event)
+    events = self.drain()
+    if len(events) > 0:
+      batches = [[] for l in self.listeners]
+      for event, broadcaster_class, event_type in self.coalesce(events):
+        for i, mask in self.get_routes(broadcaster_class):
+          if mask is None or event_type & mask:
+            batches[i].append(event)
+      for (listener, subscriptions), batch in zip(self.listeners, batches):
+        if len(batch) == 0:
+          continue
+        if self.timings is not None:
+          self.dispatch_timed(listener, batch)
+        elif hasattr(listener, 'handle_lldb_events'):
+          listener.handle_lldb_events(batch)
+        else:
+          for event in batch:
+            listener.handle_lldb_event(event)
+    while not self.calls.empty():
+      self.calls.get()()
+    for callback in self.drain_callbacks:
+      callback()
 
 def main():
   signal.signal(signal.SIGINT, sigint_handler)
 
+  args = parse_args(sys.argv)
+
   global event_queue
-  event_queue = LLDBEventQueue()
+  event_queue = LLDBEventQueue(max_events = 10000)
 
   global debugger
-  debugger = lldb.SBDebugger.Create()
+  if args.replay is not None:
+    driver = eventlog.ReplayDriver(event_queue, args.replay, args.replay_speed)
+  else:
+    debugger = lldb.SBDebugger.Create()
+    driver = debuggerdriver.createDriver(debugger, event_queue)
 
-  driver = debuggerdriver.createDriver(debugger, event_queue)
+  handle_args(driver, args)
 
-  handle_args(driver, sys.argv)
+  timings = None
+  if debug:
+    timings = timing.Timings()
+    event_queue.timings = timings
+    driver.timings = timings
 
   view = LLDBUI(event_queue, driver)
 
   # start the driver thread
   driver.start()
 
-  # hack to avoid hanging waiting for prompts!
-  driver.handleCommand("settings set auto-confirm true")
+  if args.replay is None:
+    # hack to avoid hanging waiting for prompts!
+    driver.handleCommand("settings set auto-confirm true")
 
-  view.main()
+  try:
+    view.main()
+  finally:
+    if timings is not None:
+      print timings.report()
 
 if __name__ == "__main__":
   print lldb
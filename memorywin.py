@@ -0,0 +1,234 @@
+##===-- memorywin.py -----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import lldb
+from collections import OrderedDict
+
+bytes_per_row = 16
+
+def format_row(address, data):
+  """ data holds a byte value, or None if unreadable, per byte of the row. """
+  hexes = []
+  chars = []
+  for i, b in enumerate(data):
+    if i == bytes_per_row / 2:
+      hexes.append('')
+    if b is None:
+      hexes.append('??')
+      chars.append(' ')
+    else:
+      hexes.append('%02x' % b)
+      chars.append(chr(b) if 32 <= b < 127 else '.')
+  return '%016x  %s  %s' % (address, ' '.join(hexes), ''.join(chars))
+
+class BlockCache(object):
+  """ Memory of the process, read in aligned blocks of block_size bytes and
+  kept for the last size blocks used.
+
+  A missing block is read together with the next prefetch blocks in the
+  direction of the last move, in one ReadMemory() call, so that scrolling
+  through a large buffer only takes a read every few blocks. The blocks are
+  only valid for one stop, and are dropped with invalidate() when memory
+  may have been written.
+  """
+  block_size = 16384
+  size = 128
+  prefetch = 4
+
+  def __init__(self):
+    self.stop = None
+    # block number -> data, shorter than block_size where unreadable
+    self.blocks = OrderedDict()
+    self.last = None
+    self.reads = 0
+
+  def set_stop(self, stop):
+    if stop != self.stop:
+      self.stop = stop
+      self.invalidate()
+
+  def invalidate(self):
+    self.blocks.clear()
+
+  def get(self, process, address, size):
+    """ Returns size bytes at address, as a list of values or None, from a
+    single block.
+    """
+    n, offset = divmod(address, self.block_size)
+    data = self.blocks.pop(n, None)
+    if data is None:
+      data = self.read(process, n)
+    self.blocks[n] = data
+    while len(self.blocks) > self.size:
+      self.blocks.popitem(last = False)
+    self.last = n
+    data = data[offset:offset + size]
+    return [ord(c) for c in data] + [None] * (size - len(data))
+
+  def read(self, process, n):
+    """ Reads block n and prefetches its neighbours; returns block n. """
+    if self.last is not None and n < self.last:
+      first = max(0, n - self.prefetch)
+      while self.blocks.get(first) is not None and first < n:
+        first += 1
+      last = n
+    else:
+      first = n
+      last = n + self.prefetch
+      while self.blocks.get(last) is not None and last > n:
+        last -= 1
+    data = self.read_range(process, first, last - first + 1)
+    if len(data) < (n - first + 1) * self.block_size and last != first:
+      # partly unreadable: read the block on its own to find where
+      data = self.read_range(process, n, 1)
+      first = last = n
+    for m in range(first, last + 1):
+      start = (m - first) * self.block_size
+      block = data[start:start + self.block_size]
+      if m == n or len(block) == self.block_size:
+        self.blocks[m] = block
+    return self.blocks.pop(n)
+
+  def read_range(self, process, n, count):
+    self.reads += 1
+    error = lldb.SBError()
+    data = process.ReadMemory(n * self.block_size, count * self.block_size, error)
+    if error.Fail() or data is None:
+      return ''
+    return data
+
+class MemoryWalker(urwid.ListWalker):
+  """ Rows of bytes_per_row bytes; the position of a row is its address
+  divided by bytes_per_row, so the whole address space can be scrolled.
+  """
+  cache_size = 256
+  max_row = (1 << 64) / bytes_per_row - 1
+
+  def __init__(self, cache):
+    self.cache = cache
+    self.process = None
+    self.focus = 0
+    # row -> widget
+    self.widgets = OrderedDict()
+
+  def update(self, process):
+    self.process = process
+    self.widgets.clear()
+    self._modified()
+
+  def get_focus(self):
+    return self._get_at_pos(self.focus)
+
+  def set_focus(self, focus):
+    self.focus = focus
+    self._modified()
+
+  def get_next(self, start_from):
+    return self._get_at_pos(start_from + 1)
+
+  def get_prev(self, start_from):
+    return self._get_at_pos(start_from - 1)
+
+  def _get_at_pos(self, pos):
+    if self.process is None or not 0 <= pos <= self.max_row:
+      return None, None
+    w = self.widgets.pop(pos, None)
+    if w is None:
+      address = pos * bytes_per_row
+      data = self.cache.get(self.process, address, bytes_per_row)
+      w = urwid.Text(format_row(address, data), wrap = 'clip')
+    self.widgets[pos] = w
+    if len(self.widgets) > self.cache_size:
+      self.widgets.popitem(last = False)
+    return w, pos
+
+class MemoryWin(urwid.Frame):
+  """ Hex and ASCII dump of the memory of the stopped process. It follows
+  the pc of the selected frame until 'g' is used to go to an address.
+  """
+  def __init__(self, event_queue, driver):
+    self.driver = driver
+    self.cache = BlockCache()
+    self.walker = MemoryWalker(self.cache)
+    self.status = urwid.Text('')
+    self.prompt = urwid.Edit('address: ')
+    super(MemoryWin, self).__init__(body = urwid.ListBox(self.walker),
+                                    header = self.status)
+    # the address to show, once one was entered
+    self.address = None
+    driver.addCommandListener(lambda future: event_queue.post(self.command_done))
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitStateChanged,
+        lldb.SBThread.GetBroadcasterClassName():
+            lldb.SBThread.eBroadcastBitSelectedFrameChanged
+          | lldb.SBThread.eBroadcastBitThreadSelected,
+      })
+
+  def keypress(self, size, key):
+    if self.get_focus() == 'header':
+      if key == 'enter':
+        self.go(self.prompt.get_edit_text())
+      elif key == 'esc':
+        self.close_prompt()
+      else:
+        return super(MemoryWin, self).keypress(size, key)
+      return None
+    if key == 'g' and self.walker.process is not None:
+      self.prompt.set_edit_text('')
+      self.set_header(self.prompt)
+      self.set_focus('header')
+      return None
+    return super(MemoryWin, self).keypress(size, key)
+
+  def close_prompt(self):
+    self.set_header(self.status)
+    self.set_focus('body')
+
+  def go(self, text):
+    self.close_prompt()
+    try:
+      address = int(text, 0)
+    except ValueError:
+      self.status.set_text("invalid address '%s'" % text)
+      return
+    if not 0 <= address < 1 << 64:
+      self.status.set_text("invalid address '%s'" % text)
+      return
+    self.address = address
+    self.show(address)
+
+  def show(self, address):
+    self.walker.set_focus(address // bytes_per_row)
+    self.status.set_text('0x%x' % address)
+
+  def command_done(self):
+    # the command (memory write, expression, ...) may have written to memory
+    if self.walker.process is not None:
+      self.cache.invalidate()
+      self.walker.update(self.walker.process)
+
+  def handle_lldb_event(self, event):
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    snapshot = self.driver.stop_snapshot
+    if snapshot is None:
+      self.cache.set_stop(None)
+      self.walker.update(None)
+      self.status.set_text('(process not stopped)')
+      return
+    self.cache.set_stop((snapshot.pid, snapshot.stop_id))
+    self.walker.update(self.driver.getTarget().GetProcess())
+    if self.address is not None:
+      return
+    thread = snapshot.selected_thread()
+    if thread is not None and thread.frame is not None:
+      self.show(thread.frame.pc)
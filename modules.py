@@ -0,0 +1,160 @@
+##===-- modules.py -------------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import lldb
+import bisect
+import os
+import threading
+from collections import namedtuple, OrderedDict
+
+# load_address is None if the module is not loaded, symbols the name of the
+# symbol file, if any
+ModuleInfo = namedtuple('ModuleInfo', ['path', 'uuid', 'load_address', 'symbols'])
+
+# the target events that ModuleTracker folds
+module_events = lldb.SBTarget.eBroadcastBitModulesLoaded \
+              | lldb.SBTarget.eBroadcastBitModulesUnloaded \
+              | lldb.SBTarget.eBroadcastBitSymbolsLoaded
+
+def module_info(module, target):
+  f = module.GetFileSpec()
+  path = os.path.join(f.GetDirectory() or '', f.GetFilename() or '')
+  address = module.GetObjectFileHeaderAddress().GetLoadAddress(target)
+  if address == lldb.LLDB_INVALID_ADDRESS:
+    address = None
+  symbols = None
+  spec = module.GetSymbolFileSpec()
+  if spec.IsValid():
+    symbols = spec.GetFilename()
+  return ModuleInfo(path, module.GetUUIDString(), address, symbols)
+
+def sort_key(info):
+  # unloaded modules go last
+  return (info.load_address is None, info.load_address, info.path, info.uuid)
+
+class ModuleIndex(object):
+  """ The modules of the target, sorted by load address and updated in place. """
+  def __init__(self):
+    # (path, uuid) -> ModuleInfo
+    self.modules = {}
+    # sort_key() of each module, sorted
+    self.order = []
+
+  def __len__(self):
+    return len(self.order)
+
+  def get(self, pos):
+    if 0 <= pos < len(self.order):
+      return self.modules[self.order[pos][2:]]
+    return None
+
+  def clear(self):
+    self.modules = {}
+    self.order = []
+
+  def position(self, info):
+    return bisect.bisect_left(self.order, sort_key(info))
+
+  def update(self, changes):
+    """ Applies {(path, uuid): ModuleInfo or None if unloaded}. """
+    # many changes at once are cheaper to sort than to insert one by one
+    rebuild = len(changes) > len(self.order) / 4
+    for key, info in changes.iteritems():
+      old = self.modules.pop(key, None)
+      if old is not None and not rebuild:
+        del self.order[self.position(old)]
+      if info is not None:
+        self.modules[key] = info
+        if not rebuild:
+          bisect.insort(self.order, sort_key(info))
+    if rebuild:
+      self.order = sorted(sort_key(info) for info in self.modules.itervalues())
+
+class ModuleTracker(object):
+  """ Folds module events into batched updates of a ModuleIndex.
+
+  add_event() is called on the driver thread for each module event; the
+  modules it carries are read right away, but the index is only updated
+  on the UI thread, interval seconds after the first pending event, with
+  everything that changed meanwhile. When the target changes or its
+  process exits, reset() replaces the whole index instead. Callbacks
+  registered with
+  add_listener() are then called with the number of modules changed.
+  Attaching to a process with thousands of libraries thus costs a handful
+  of updates rather than an event per library.
+  """
+  interval = 0.25
+
+  def __init__(self, event_queue):
+    self.event_queue = event_queue
+    self.index = ModuleIndex()
+    self.listeners = []
+    self.target = None
+    # (path, uuid) -> ModuleInfo, or None if unloaded
+    self.pending = OrderedDict()
+    # whether the index is cleared before pending is applied
+    self.replace = False
+    self.timer = None
+    self.lock = threading.Lock()
+    self.events = 0
+    self.updates = 0
+
+  def add_listener(self, callback):
+    self.listeners.append(callback)
+
+  def add_event(self, event, target):
+    if self.target is None or target != self.target:
+      self.reset(target)
+    unloaded = event.GetType() & lldb.SBTarget.eBroadcastBitModulesUnloaded
+    n = lldb.SBTarget.GetNumModulesFromEvent(event)
+    infos = [module_info(lldb.SBTarget.GetModuleAtIndexFromEvent(i, event), target)
+             for i in range(n)]
+    with self.lock:
+      self.events += 1
+      for info in infos:
+        self.pending[(info.path, info.uuid)] = None if unloaded else info
+      self.schedule()
+
+  def reset(self, target):
+    """ Replaces the index with the modules of target as they are now; the
+        load addresses of the previous target or process no longer apply.
+    """
+    infos = []
+    if target.IsValid():
+      infos = [module_info(target.GetModuleAtIndex(i), target)
+               for i in range(target.GetNumModules())]
+    with self.lock:
+      self.target = target
+      self.pending = OrderedDict(((info.path, info.uuid), info) for info in infos)
+      self.replace = True
+      self.schedule()
+
+  def schedule(self):
+    # caller holds self.lock
+    if self.timer is None:
+      self.timer = threading.Timer(self.interval, self.flush)
+      self.timer.daemon = True
+      self.timer.start()
+
+  def flush(self):
+    with self.lock:
+      pending = self.pending
+      replace = self.replace
+      self.pending = OrderedDict()
+      self.replace = False
+      self.timer = None
+    self.event_queue.post(lambda: self.apply(pending, replace))
+
+  def apply(self, changes, replace = False):
+    if replace:
+      self.index.clear()
+    self.index.update(changes)
+    self.updates += 1
+    for callback in self.listeners:
+      callback(len(changes))
@@ -0,0 +1,90 @@
+##===-- modulewin.py -----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import os
+import modules
+from collections import OrderedDict
+
+class ModuleWalker(urwid.ListWalker):
+  """ Shows the rows of a ModuleIndex; widgets are only built for the rows
+  displayed, and the focus stays on the same module as the index changes.
+  """
+  cache_size = 256
+
+  def __init__(self, index):
+    self.index = index
+    self.focus = 0
+    # (path, uuid) of the module focused
+    self.focus_module = None
+    # sort key -> widget
+    self.widgets = OrderedDict()
+
+  def update(self):
+    self.widgets.clear()
+    info = self.index.modules.get(self.focus_module)
+    if info is not None:
+      self.focus = self.index.position(info)
+    self.focus = max(0, min(self.focus, len(self.index) - 1))
+    self._modified()
+
+  def get_focus(self):
+    return self._get_at_pos(self.focus)
+
+  def set_focus(self, focus):
+    self.focus = focus
+    info = self.index.get(focus)
+    if info is not None:
+      self.focus_module = (info.path, info.uuid)
+    self._modified()
+
+  def get_next(self, start_from):
+    return self._get_at_pos(start_from + 1)
+
+  def get_prev(self, start_from):
+    return self._get_at_pos(start_from - 1)
+
+  def _get_at_pos(self, pos):
+    info = self.index.get(pos)
+    if info is None:
+      return None, None
+    key = modules.sort_key(info)
+    w = self.widgets.pop(key, None)
+    if w is None:
+      w = self.make_widget(info)
+    self.widgets[key] = w
+    if len(self.widgets) > self.cache_size:
+      self.widgets.popitem(last = False)
+    return w, pos
+
+  def make_widget(self, info):
+    if info.load_address is None:
+      address = '(not loaded)'
+    else:
+      address = '0x%016x' % info.load_address
+    text = '%-18s %-36s %-20s %s' % (address, info.uuid or '-',
+                                     info.symbols or '(no symbols)',
+                                     os.path.basename(info.path))
+    if info.symbols is None:
+      return urwid.AttrWrap(urwid.Text(text), 'nosymbols')
+    return urwid.Text(text)
+
+class ModuleWin(urwid.Frame):
+  def __init__(self, event_queue, driver):
+    self.tracker = driver.modules
+    self.walker = ModuleWalker(self.tracker.index)
+    self.count = urwid.Text('')
+    super(ModuleWin, self).__init__(body = urwid.ListBox(self.walker),
+                                    header = self.count)
+    self.tracker.add_listener(self.modules_changed)
+    self.modules_changed(0)
+
+  def modules_changed(self, n):
+    self.walker.update()
+    self.count.set_text('%d modules' % len(self.tracker.index))
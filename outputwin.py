@@ -0,0 +1,89 @@
+##===-- outputwin.py -----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import lldb
+from collections import OrderedDict
+
+class OutputWalker(urwid.ListWalker):
+  """ Shows the lines kept in the driver's ProcessOutput ring buffer.
+
+  Positions are line numbers since the start of the session, so they stay
+  valid while old lines fall out of the ring. Widgets are only built for
+  the lines that are displayed. The focus follows the tail until the user
+  scrolls away from it.
+  """
+  cache_size = 256
+
+  def __init__(self, output):
+    self.output = output
+    self.focus = 0
+    self.follow = True
+    self.widgets = OrderedDict()
+    # output.total when last updated
+    self.seen = 0
+
+  def update(self):
+    output = self.output
+    if output.total == 0:
+      return
+    # the line that was last when we looked may have grown since
+    self.widgets.pop(self.seen - 1, None)
+    self.seen = output.total
+    if self.follow or self.focus < output.first:
+      self.focus = output.total - 1
+    self._modified()
+
+  def get_focus(self):
+    return self._get_at_pos(self.focus)
+
+  def set_focus(self, focus):
+    self.focus = focus
+    self.follow = focus >= self.output.total - 1
+    self._modified()
+
+  def get_next(self, start_from):
+    return self._get_at_pos(start_from + 1)
+
+  def get_prev(self, start_from):
+    return self._get_at_pos(start_from - 1)
+
+  def _get_at_pos(self, pos):
+    line = self.output.get(pos)
+    if line is None:
+      return None, None
+
+    w = self.widgets.pop(pos, None)
+    if w is None:
+      is_error, text = line
+      w = urwid.Text(text.decode('utf-8', 'replace'))
+      if is_error:
+        w = urwid.AttrWrap(w, 'error')
+    self.widgets[pos] = w
+    if len(self.widgets) > self.cache_size:
+      self.widgets.popitem(last = False)
+    return w, pos
+
+class OutputWin(urwid.ListBox):
+  def __init__(self, event_queue, driver):
+    self.walker = OutputWalker(driver.process_output)
+    super(OutputWin, self).__init__(self.walker)
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitSTDOUT
+          | lldb.SBProcess.eBroadcastBitSTDERR
+          | lldb.SBProcess.eBroadcastBitStateChanged
+      })
+
+  def handle_lldb_event(self, event):
+    self.walker.update()
+
+  def handle_lldb_events(self, events):
+    # the driver has already read the output into the ring buffer
+    self.walker.update()
@@ -0,0 +1,122 @@
+##===-- profiledata.py ---------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+"""
+Time series of the profile data the debug server sends while the process
+runs (see 'process plugin packet send QSetEnableAsyncProfiling;enable:1;').
+
+Each sample is a list of key:value pairs separated by ';' and terminated by
+'--end--;', e.g.
+  elapsed_usec:...;total_user_usec:...;total_sys_usec:...;num_cpu:8;
+  thread_used_id:1a03;thread_used_usec:...;thread_used_name:6d61696e;...
+thread_used_* pairs repeat for each thread, the name being hex encoded.
+"""
+
+import threading
+from collections import deque
+
+end_marker = '--end--;'
+
+def parse_sample(data):
+  """ Returns ({key: value}, [(tid, name, used usec)]) of a sample. Values
+      are ints if they are numbers.
+  """
+  totals = {}
+  threads = []
+  for item in data.split(';'):
+    if ':' not in item:
+      continue
+    key, value = item.split(':', 1)
+    if key == 'thread_used_id':
+      threads.append([int(value, 16), None, 0])
+    elif key == 'thread_used_usec' and len(threads) > 0:
+      threads[-1][2] = int(value)
+    elif key == 'thread_used_name' and len(threads) > 0:
+      try:
+        threads[-1][1] = value.decode('hex')
+      except TypeError:
+        threads[-1][1] = value
+    else:
+      try:
+        totals[key] = int(value)
+      except ValueError:
+        totals[key] = value
+  return totals, [tuple(t) for t in threads]
+
+class Series(object):
+  """ The last size values of a measurement. """
+  def __init__(self, size):
+    self.values = deque(maxlen = size)
+
+  def add(self, value):
+    self.values.append(value)
+
+  def last(self):
+    if len(self.values) == 0:
+      return None
+    return self.values[-1]
+
+class ProfileData(object):
+  """ CPU usage of the process and of each of its threads, as percentages of
+  one CPU over the interval between two samples, in fixed-size series.
+
+  Fed on the driver thread with the raw data; version is incremented for
+  each sample so that readers can tell when to redraw. Threads missing
+  from a sample lose their series, which bounds the memory used.
+  """
+  def __init__(self, size = 120):
+    self.size = size
+    self.cpu = Series(size)
+    # tid -> Series
+    self.threads = {}
+    self.names = {}
+    self.totals = {}
+    self.previous = None
+    self.pending = ''
+    self.version = 0
+    self.lock = threading.Lock()
+
+  def add_data(self, data):
+    """ Adds raw profile data, which may hold partial or several samples. """
+    self.pending += data
+    while end_marker in self.pending:
+      sample, self.pending = self.pending.split(end_marker, 1)
+      self.add_sample(*parse_sample(sample))
+
+  def add_sample(self, totals, threads):
+    previous = self.previous
+    self.previous = (totals, dict((tid, used) for tid, name, used in threads))
+    elapsed = totals.get('elapsed_usec')
+    if previous is None or not isinstance(elapsed, int):
+      return
+    prev_totals, prev_threads = previous
+    interval = elapsed - prev_totals.get('elapsed_usec', elapsed)
+    if interval <= 0:
+      return
+
+    def usage(now, before):
+      return max(0.0, 100.0 * (now - before) / interval)
+
+    with self.lock:
+      self.totals = totals
+      used = totals.get('total_user_usec', 0) + totals.get('total_sys_usec', 0)
+      prev_used = prev_totals.get('total_user_usec', 0) + prev_totals.get('total_sys_usec', 0)
+      self.cpu.add(usage(used, prev_used))
+      threads_seen = {}
+      for tid, name, used in threads:
+        series = self.threads.get(tid) or Series(self.size)
+        series.add(usage(used, prev_threads.get(tid, used)))
+        threads_seen[tid] = series
+        if name:
+          self.names[tid] = name
+      for tid in self.threads:
+        if tid not in threads_seen:
+          self.names.pop(tid, None)
+      self.threads = threads_seen
+      self.version += 1
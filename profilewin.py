@@ -0,0 +1,96 @@
+##===-- profilewin.py ----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import lldb
+import threading
+import time
+
+bars = u' \u2581\u2582\u2583\u2584\u2585\u2586\u2587\u2588'
+
+def sparkline(values, width):
+  """ Draws the last width percentages, one character each, scaled to 100
+      or to their maximum if more than one CPU is used.
+  """
+  values = list(values)[-width:]
+  top = max([100.0] + values)
+  chars = []
+  for v in values:
+    i = int(round(min(v, top) / top * (len(bars) - 1)))
+    chars.append(bars[i])
+  return u''.join(chars).rjust(width)
+
+class ProfileWin(urwid.ListBox):
+  """ CPU usage of the running process and of its busiest threads, from the
+  driver's ProfileData. Redrawn at most once every refresh_interval seconds,
+  however often profile data arrives.
+  """
+  refresh_interval = 0.5
+  spark_width = 40
+  max_threads = 50
+
+  def __init__(self, event_queue, driver):
+    self.event_queue = event_queue
+    self.profile = driver.profile
+    self.walker = urwid.SimpleListWalker([])
+    super(ProfileWin, self).__init__(self.walker)
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitProfileData
+      })
+    self.version = None
+    self.last_refresh = 0
+    self.timer = None
+    self.refresh()
+
+  def handle_lldb_event(self, event):
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    wait = self.last_refresh + self.refresh_interval - time.time()
+    if wait <= 0:
+      self.refresh()
+    elif self.timer is None:
+      self.timer = threading.Timer(wait, self.event_queue.post, [self.refresh])
+      self.timer.daemon = True
+      self.timer.start()
+
+  def refresh(self):
+    self.timer = None
+    self.last_refresh = time.time()
+    profile = self.profile
+    if profile.version == self.version:
+      return
+    self.version = profile.version
+    if profile.version == 0:
+      self.walker[:] = [urwid.Text('No profile data. Enable it with:\n'
+          "process plugin packet send 'QSetEnableAsyncProfiling;enable:1;'")]
+      return
+
+    with profile.lock:
+      rows = [(None, 'process', profile.cpu)]
+      threads = sorted(profile.threads.items(), key = lambda t: -t[1].last())
+      for tid, series in threads[:self.max_threads]:
+        rows.append((tid, profile.names.get(tid, ''), series))
+      rows = [(tid, name, series.last(), sparkline(series.values, self.spark_width))
+              for tid, name, series in rows]
+      hidden = len(threads) - self.max_threads
+
+    widgets = []
+    for tid, name, cpu, spark in rows:
+      label = name if tid is None else '0x%x %s' % (tid, name)
+      widgets.append(urwid.Columns([
+          ('fixed', 30, urwid.Text(label[:30])),
+          ('fixed', 8, urwid.Text('%6.1f%%' % cpu, align = 'right')),
+          ('fixed', 1, urwid.Text(' ')),
+          urwid.AttrWrap(urwid.Text(spark), 'number'),
+        ]))
+    if hidden > 0:
+      widgets.append(urwid.Text('(%d more threads)' % hidden))
+    self.walker[:] = widgets
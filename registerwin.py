@@ -0,0 +1,172 @@
+##===-- registerwin.py ---------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import lldb
+
+# triple -> [(set name, (register names))]
+layouts = {}
+
+def register_layout(triple, frame):
+  """ Returns the register sets of the architecture, read once per triple. """
+  layout = layouts.get(triple)
+  if layout is None:
+    layout = []
+    sets = frame.GetRegisters()
+    for i in range(sets.GetSize()):
+      regs = sets.GetValueAtIndex(i)
+      names = tuple(regs.GetChildAtIndex(j).GetName()
+                    for j in range(regs.GetNumChildren()))
+      layout.append((regs.GetName(), names))
+    if triple is not None:
+      layouts[triple] = layout
+  return layout
+
+def read_set(frame, index):
+  """ Returns the values of register set index, in layout order. """
+  regs = frame.GetRegisters().GetValueAtIndex(index)
+  return tuple(regs.GetChildAtIndex(j).GetValue()
+               for j in range(regs.GetNumChildren()))
+
+class RegisterWalker(urwid.ListWalker):
+  """ One register set; widgets are only built for the rows displayed. """
+  def __init__(self):
+    self.names = ()
+    self.values = ()
+    self.changed = frozenset()
+    self.focus = 0
+    # row -> widget
+    self.widgets = {}
+
+  def update(self, names, values, changed):
+    self.names = names
+    self.values = values
+    self.changed = changed
+    self.widgets = {}
+    self.focus = max(0, min(self.focus, len(names) - 1))
+    self._modified()
+
+  def get_focus(self):
+    return self._get_at_pos(self.focus)
+
+  def set_focus(self, focus):
+    self.focus = focus
+    self._modified()
+
+  def get_next(self, start_from):
+    return self._get_at_pos(start_from + 1)
+
+  def get_prev(self, start_from):
+    return self._get_at_pos(start_from - 1)
+
+  def _get_at_pos(self, pos):
+    if not 0 <= pos < len(self.names):
+      return None, None
+    w = self.widgets.get(pos)
+    if w is None:
+      text = '%-10s %s' % (self.names[pos], self.values[pos] or '')
+      attr = 'stopped' if pos in self.changed else None
+      w = self.widgets[pos] = urwid.AttrWrap(urwid.Text(text), attr, 'key')
+    return w, pos
+
+class RegisterWin(urwid.Frame):
+  """ One register set of the selected frame at a time; registers that
+  changed since the previous stop are highlighted. Enter shows the next set.
+
+  Only the set shown is read, once per stop and frame. The values of the
+  previous stop are kept, as tuples in layout order, to find the changes.
+  """
+  def __init__(self, event_queue, driver):
+    self.driver = driver
+    self.walker = RegisterWalker()
+    self.status = urwid.Text('')
+    super(RegisterWin, self).__init__(body = urwid.ListBox(self.walker),
+                                      header = self.status)
+    self.set_index = 0
+    self.frame = None
+    self.stop = None
+    # (tid, frame index, set index) -> values, at this stop and the previous
+    self.current = {}
+    self.previous = {}
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitStateChanged,
+        lldb.SBThread.GetBroadcasterClassName():
+            lldb.SBThread.eBroadcastBitStackChanged
+          | lldb.SBThread.eBroadcastBitSelectedFrameChanged
+          | lldb.SBThread.eBroadcastBitThreadSelected,
+      })
+
+  def keypress(self, size, key):
+    if key == 'enter':
+      if self.frame is not None:
+        self.set_index += 1
+        self.show()
+      return None
+    return super(RegisterWin, self).keypress(size, key)
+
+  def handle_lldb_event(self, event):
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    snapshot = self.driver.stop_snapshot
+    if snapshot is None:
+      self.status.set_text('(process not stopped)')
+      return
+    thread = snapshot.selected_thread()
+    if thread is None or thread.frame is None:
+      self.frame = None
+      self.walker.update((), (), frozenset())
+      self.status.set_text('no frame selected')
+      return
+    stop = (snapshot.pid, snapshot.stop_id)
+    if stop != self.stop:
+      if self.stop is None or stop[0] != self.stop[0]:
+        self.previous = {}
+      else:
+        self.previous = self.current
+      self.current = {}
+      self.stop = stop
+    self.frame = (thread.tid, thread.frame.index)
+    self.show()
+
+  def show(self):
+    tid, index = self.frame
+    target = self.driver.getTarget()
+    sbframe = None
+    triple = target.GetTriple()
+    layout = layouts.get(triple)
+    if layout is None:
+      sbframe = target.GetProcess().GetThreadByID(tid).GetFrameAtIndex(index)
+      layout = register_layout(triple, sbframe)
+    if len(layout) == 0:
+      self.walker.update((), (), frozenset())
+      self.status.set_text('no registers')
+      return
+    self.set_index %= len(layout)
+
+    key = (tid, index, self.set_index)
+    values = self.current.get(key)
+    if values is None:
+      if sbframe is None:
+        sbframe = target.GetProcess().GetThreadByID(tid).GetFrameAtIndex(index)
+      values = self.current[key] = read_set(sbframe, self.set_index)
+    old = self.previous.get(key)
+    if old is None or len(old) != len(values):
+      changed = frozenset()
+    else:
+      changed = frozenset(i for i, v in enumerate(values) if v != old[i])
+
+    name, names = layout[self.set_index]
+    if len(names) != len(values):
+      # the layout was read from another architecture
+      names = names[:len(values)] + ('?',) * (len(values) - len(names))
+    self.walker.update(names, values, changed)
+    self.status.set_text('%s (%d/%d), %d changed' % (name, self.set_index + 1,
+                                                     len(layout), len(changed)))
@@ -0,0 +1,85 @@
+##===-- sourcepath.py ----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import os
+import time
+from collections import OrderedDict
+
+# (old prefix, new prefix) rules rewriting the paths found in debug info,
+# tried in order before the unmodified path
+source_map = []
+
+def add_source_map(old, new):
+  source_map.append((old.rstrip('/'), new.rstrip('/')))
+
+class SourceResolver(object):
+  """ Maps the directory and file name of a line entry to a local path.
+
+  Resolved paths are cached until forget() is called for them, for the
+  last cache_size files. Misses are cached for miss_ttl seconds, so that
+  repeatedly stopping in frames whose source does not exist here does not
+  touch the filesystem every time.
+  """
+  miss_ttl = 30.0
+  cache_size = 4096
+
+  def __init__(self, rules = None):
+    self.rules = source_map if rules is None else rules
+    # (directory, filename) -> path, least recently used first
+    self.hits = OrderedDict()
+    # (directory, filename) -> expiry time, oldest first
+    self.misses = OrderedDict()
+
+  def resolve(self, directory, filename):
+    """ Returns a path to an existing file, or None. """
+    key = (directory, filename)
+    path = self.hits.pop(key, None)
+    if path is not None:
+      self.hits[key] = path
+      return path
+    now = time.time()
+    self.prune(now)
+    if key in self.misses:
+      return None
+
+    path = self.lookup(directory, filename)
+    if path is None:
+      self.misses[key] = now + self.miss_ttl
+      if len(self.misses) > self.cache_size:
+        self.misses.popitem(last = False)
+    else:
+      self.hits[key] = path
+      if len(self.hits) > self.cache_size:
+        self.hits.popitem(last = False)
+    return path
+
+  def prune(self, now):
+    # misses are added with the same ttl, so they expire in order
+    while len(self.misses) > 0:
+      key, expiry = next(self.misses.iteritems())
+      if expiry > now:
+        break
+      del self.misses[key]
+
+  def forget(self, directory, filename):
+    """ Drops a cached resolution, e.g. because the file went away. """
+    self.hits.pop((directory, filename), None)
+
+  def candidates(self, directory, filename):
+    path = os.path.join(directory or '', filename)
+    for old, new in self.rules:
+      if path == old or path.startswith(old + '/'):
+        yield new + path[len(old):]
+    yield path
+
+  def lookup(self, directory, filename):
+    for path in self.candidates(directory, filename):
+      if os.path.isfile(path):
+        return path
+    return None
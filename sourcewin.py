@@ -9,137 +9,453 @@
 
 import urwid
 import lldb, lldbutil
+import highlight
+import sourcepath
 import re
 import os
+import mmap
+import threading
+import time
+import bisect
+from array import array
+from collections import OrderedDict
+
+newline_re = re.compile('\n')
+
+class SourceBuffer(object):
+  """ Raw contents of a source file plus the offset at which each line starts.
+
+  data may be a string or a read-only mmap of file. The offset index is
+  built on demand, up to the line being asked for, and optionally completed
+  by a background thread; lines are only decoded when they are displayed.
+  spans holds the syntax highlighting of each line, once it is known.
+
+  Touching the pages of a mapped file that was truncated since (say by a
+  rebuild) raises SIGBUS, so the file is checked with stale() before the
+  map is read, and the map is closed as soon as the buffer is evicted.
+  """
+  chunk_size = 1024 * 1024
+
+  def __init__(self, data, path = None, file = None):
+    self.data = data
+    self.path = path
+    self.file = file
+    self.size = len(data)
+    self.closed = False
+    self.spans = {}
+    self.highlighted = False
+    # set by the highlighter's worker once it lexed the whole buffer;
+    # highlighted only follows when the results reach the UI thread
+    self.lexed = False
+    # (first, end) line ranges the highlighter's worker is lexing
+    self.windows = set()
+    # pattern -> SourceSearch, for the most recent patterns
+    self.searches = OrderedDict()
+    self.offsets = array('L', [0])
+    self.scanned = 0
+    self.complete = False
+    self.lock = threading.Lock()
+
+  def stale(self):
+    """ Returns True if the mapped file was closed or truncated. """
+    if self.file is None:
+      return False
+    if self.closed:
+      return True
+    try:
+      return os.fstat(self.file.fileno()).st_size < self.size
+    except (OSError, ValueError):
+      return True
+
+  def chunks(self, begin, end):
+    """ Yields (offset, text) copies of the bytes from begin to end, about
+        chunk_size at a time and cut at line starts; needs the whole index.
+    """
+    offsets = self.offsets
+    while begin < end:
+      i = bisect.bisect_left(offsets, begin + self.chunk_size)
+      stop = min(end, offsets[i]) if i < len(offsets) else end
+      if self.stale():
+        return
+      try:
+        text = self.data[begin:stop]
+      except ValueError:
+        # closed meanwhile
+        return
+      yield begin, text
+      begin = stop
+
+  def close(self):
+    """ Unmaps the file; the buffer reads as empty from then on. """
+    if self.file is None:
+      return
+    with self.lock:
+      self.closed = True
+      self.complete = True
+      self.data.close()
+      self.file.close()
+
+  def has_line(self, lineno):
+    if lineno + 1 < len(self.offsets):
+      return True
+    self.index_to(lineno)
+    return lineno + 1 < len(self.offsets)
+
+  def line(self, lineno):
+    """ Returns the text of the (0-based) line lineno. """
+    if self.stale():
+      return u''
+    text = self.data[self.offsets[lineno]:self.offsets[lineno + 1] - 1]
+    return text.rstrip('\r').decode('utf-8', 'replace')
+
+  def index_to(self, lineno):
+    """ Extends the offset index until it covers lineno (None for all lines). """
+    with self.lock:
+      while not self.complete and \
+          (lineno is None or lineno + 1 >= len(self.offsets)):
+        self.scan(self.chunk_size)
+
+  def index_in_background(self):
+    def worker():
+      while not self.complete:
+        with self.lock:
+          if not self.complete:
+            self.scan(self.chunk_size)
+    t = threading.Thread(target = worker)
+    t.daemon = True
+    t.start()
+
+  def scan(self, nbytes):
+    # caller holds self.lock
+    if self.stale():
+      self.complete = True
+      return
+    data = self.data
+    end = min(self.scanned + nbytes, len(data))
+    self.offsets.extend(m.end() for m in newline_re.finditer(data, self.scanned, end))
+    self.scanned = end
+    if end == len(data):
+      if end > 0 and data[end - 1] != '\n':
+        self.offsets.append(end + 1)
+      self.complete = True
+
+class SourceSearch(object):
+  """ The lines of a SourceBuffer matching a regular expression.
+
+  The raw buffer is scanned on a worker thread, starting at the given line
+  and wrapping around, so the first match after that line is found first.
+  Matching lines are handed to found(search) on the UI thread in batches as
+  they are discovered.
+  """
+  batch_interval = 0.1
+  cache_size = 8
+
+  def __init__(self, buffer, pattern, start):
+    self.buffer = buffer
+    self.pattern = pattern
+    self.regex = re.compile(pattern, re.MULTILINE)
+    # matching (0-based) lines from the start line to the end of the file,
+    # and from the top of the file to the start line, in order
+    self.after = []
+    self.before = []
+    self.complete = False
+    self.cancelled = False
+    self.started = False
+    self.start = start
+
+  @classmethod
+  def get(cls, buffer, pattern, start):
+    """ Returns the cached search for pattern, or a new one that has not
+        been started yet. Raises re.error for invalid patterns.
+    """
+    search = buffer.searches.pop(pattern, None)
+    if search is None or search.cancelled:
+      search = cls(buffer, pattern, start)
+    buffer.searches[pattern] = search
+    while len(buffer.searches) > cls.cache_size:
+      old_pattern, old = buffer.searches.popitem(last = False)
+      old.cancel()
+    return search
+
+  def lines(self):
+    return self.before + self.after
+
+  def cancel(self):
+    if not self.complete:
+      self.cancelled = True
+      self.buffer.searches.pop(self.pattern, None)
+
+  def run(self, event_queue, found):
+    self.started = True
+    t = threading.Thread(target = self.worker, args = (event_queue, found))
+    t.daemon = True
+    t.start()
+
+  def worker(self, event_queue, found):
+    buffer = self.buffer
+    # the whole index is needed to map offsets to lines
+    buffer.index_to(None)
+    offsets = buffer.offsets
+    split = offsets[min(self.start, len(offsets) - 1)]
+
+    def publish(lines, after, complete):
+      def apply():
+        if after:
+          self.after.extend(lines)
+        else:
+          self.before.extend(lines)
+        self.complete = complete
+        found(self)
+      event_queue.post(apply)
+
+    first = True
+    for begin, end, after in [(split, buffer.size, True), (0, split, False)]:
+      batch = []
+      last_line = -1
+      last_publish = time.time()
+      for base, text in buffer.chunks(begin, end):
+        for m in self.regex.finditer(text):
+          if self.cancelled:
+            return
+          line = bisect.bisect_right(offsets, base + m.start()) - 1
+          if line == last_line:
+            continue
+          last_line = line
+          batch.append(line)
+          now = time.time()
+          # the first match is published right away so it can be jumped to
+          if first or now - last_publish > self.batch_interval:
+            publish(batch, after, False)
+            batch = []
+            first = False
+            last_publish = now
+      publish(batch, after, not after)
+
+def read_source(path, map_above = 1024 * 1024):
+  """ Reads the file at path into the heap, or maps it if it is bigger than
+      map_above bytes.
+  """
+  f = open(path, 'rb')
+  try:
+    if os.fstat(f.fileno()).st_size <= map_above:
+      return SourceBuffer(f.read(), path)
+    # the file stays open so that stale() can check its size
+    data = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+    buffer = SourceBuffer(data, path, f)
+    f = None
+  finally:
+    if f is not None:
+      f.close()
+  buffer.index_in_background()
+  return buffer
+
+class SourceCache(object):
+  """ SourceBuffers keyed by path, validated against the file's mtime and size
+      and evicted least-recently-used first once the byte budget (in file
+      bytes) is exceeded.
+  """
+  def __init__(self, budget = 64 * 1024 * 1024):
+    self.budget = budget
+    self.nbytes = 0
+    self.entries = OrderedDict()
+
+  def get(self, path):
+    """ Returns the SourceBuffer for path. Raises IOError/OSError. """
+    st = os.stat(path)
+    entry = self.entries.pop(path, None)
+    if entry is not None:
+      mtime, size, buffer = entry
+      if mtime == st.st_mtime and size == st.st_size:
+        self.entries[path] = entry
+        return buffer
+      self.nbytes -= size
+      buffer.close()
+
+    # files that fit in the budget are copied: only a map can be truncated
+    buffer = read_source(path, self.budget)
+    self.entries[path] = (st.st_mtime, st.st_size, buffer)
+    self.nbytes += st.st_size
+    self.evict()
+    return buffer
+
+  def evict(self):
+    # always keep the most recent entry, even if it exceeds the budget alone
+    while self.nbytes > self.budget and len(self.entries) > 1:
+      path, (mtime, size, buffer) = self.entries.popitem(last = False)
+      self.nbytes -= size
+      buffer.close()
+
+location_re = re.compile('at\ ([^:]+):([\d]+)')
+
+def get_line_locations(locations):
+  """ Yields (location ID, file name, line) for each location that has one. """
+  for location in locations:
+    # hack! getting the LineEntry via SBBreakpointLocation.GetAddress.GetLineEntry does not work good for
+    # inlined frames, so we get the description (which does take into account inlined functions) and parse it.
+    desc = lldbutil.get_description(location, lldb.eDescriptionLevelFull)
+    match = location_re.search(desc)
+    if match is None:
+      # bp loc unparsable
+      continue
+    yield location.GetID(), match.group(1), int(match.group(2))
+
+class BreakpointIndex(object):
+  """ The source lines that carry a breakpoint location, keyed by file name.
+
+  Locations are remembered per breakpoint and location ID so that each
+  breakpoint event applies just the locations it carries. add() and remove()
+  return the lines whose marker changed, as a dict of file name -> set.
+  """
+  def __init__(self):
+    # file name -> { line: number of locations }
+    self.files = {}
+    # breakpoint ID -> { location ID: (file name, line) }
+    self.locations = {}
+
+  def lines(self, filename):
+    """ Returns a live container of the marked lines of filename. """
+    return self.files.setdefault(filename, {})
+
+  def add(self, bp_id, locations):
+    changed = {}
+    locs = self.locations.setdefault(bp_id, {})
+    for loc_id, filename, line in locations:
+      if loc_id in locs:
+        continue
+      locs[loc_id] = (filename, line)
+      counts = self.lines(filename)
+      if line not in counts:
+        counts[line] = 0
+        changed.setdefault(filename, set()).add(line)
+      counts[line] += 1
+    return changed
+
+  def remove(self, bp_id, loc_ids = None):
+    """ Removes the given locations of bp_id, or all of them if loc_ids is None. """
+    changed = {}
+    locs = self.locations.get(bp_id)
+    if locs is None:
+      return changed
+    if loc_ids is None:
+      loc_ids = locs.keys()
+    for loc_id in loc_ids:
+      if loc_id not in locs:
+        continue
+      filename, line = locs.pop(loc_id)
+      counts = self.files[filename]
+      counts[line] -= 1
+      if counts[line] == 0:
+        del counts[line]
+        changed.setdefault(filename, set()).add(line)
+    if len(locs) == 0:
+      del self.locations[bp_id]
+    return changed
 
 class SourceWalker(urwid.ListWalker):
+  """ Builds line widgets on demand and keeps only the most recently used ones. """
+  cache_size = 256
+
+  markerPC = ":) "
+  markerBP = "B> "
+  markerNone  = "   "
+
   def __init__(self):
     self.focus = 0
-    self.lines = []
+    self.buffer = None
+    self.msg = None
+    self.widgets = OrderedDict()
+    self.highlighter = None
+    # 1-based line numbers, as reported by lldb
+    self.pc_line = None
+    self.bp_lines = set()
 
   def message(self, msg):
-    w = urwid.Text('\n[ %s ]' % msg, align='center')
-    self.lines = [w]
+    self.buffer = None
+    self.msg = urwid.Text('\n[ %s ]' % msg, align='center')
+    self.widgets.clear()
+    self.focus = 0
     self._modified()
 
   def set_unavailable(self, msg = 'Source information unavailable'):
     self.message(msg)
 
   def set_filepath(self, path):
-    self.lines = []
-    lines = []
     try:
-      with open(path) as f:
-        lines = [line.rstrip('\r\n') for line in f]
+      buffer = read_source(path)
     except IOError as e:
       self.set_unavailable(e.strerror)
       return
+    self.set_buffer(buffer)
+
+  def set_buffer(self, buffer):
+    self.buffer = buffer
+    self.msg = None
+    self.widgets.clear()
+    self.focus = 0
+    self.pc_line = None
+    self.bp_lines = set()
+    self._modified()
 
-    #try:
-    #  from pygments.lexers import get_lexer_for_filename
-    #  from pygments.formatter import Formatter
-
-    #  class UrwidFormatter(Formatter):
-    #    def convert(self, color):
-    #      r = int(color[:2], 16)
-    #      g = int(color[2:4], 16)
-    #      b = int(color[4:], 16)
-    #      r = urwid.util.int_scale(r, 255, 6)
-    #      g = urwid.util.int_scale(r, 255, 6)
-    #      b = urwid.util.int_scale(r, 255, 6)
-    #      return '#%x%x%x' % (r, g, b)
-
-    #    def __init__(self, **options):
-    #      Formatter.__init__(self, **options)
-    #      self.text = []
-    #      # create a dict of (start, end) tuples that wrap the
-    #      # value of a token so that we can use it in the format
-    #      # method later
-    #      self.styles = {}
-
-    #      # we iterate over the `_styles` attribute of a style item
-    #      # that contains the parsed style values.
-    #      for token, style in self.style:
-    #        start = "(urwid.AttrSpec('"
-    #        # a style item is a tuple in the following form:
-    #        # colors are readily specified in hex: 'RRGGBB'
-    #        if style['color']:
-    #          start += self.convert(style['color'])
-    #          #end = '</font>' + end
-    #        else:
-    #          start += "default"
-
-    #        if style['bold']:
-    #          start += ', bold'
-    #        if style['underline']:
-    #          start += ', underline'
-    #        start += "', 'default', 256), '"
-
-    #        end = "'), "
-
-    #        self.styles[token] = (start, end)
-
-    #    def format(self, tokensource, outfile):
-    #      # lastval is a string we use for caching
-    #      # because it's possible that an lexer yields a number
-    #      # of consecutive tokens with the same token type.
-    #      # to minimize the size of the generated html markup we
-    #      # try to join the values of same-type tokens here
-    #      lastval = ''
-    #      lasttype = None
-    #
-    #      outfile.write('[')
-    #
-    #      for ttype, value in tokensource:
-    #        value = value.rstrip('\r\n')
-    #        # if the token type doesn't exist in the stylemap
-    #        # we try it with the parent of the token type
-    #        # eg: parent of Token.Literal.String.Double is
-    #        # Token.Literal.String
-    #        while ttype not in self.styles:
-    #          ttype = ttype.parent
-    #        if ttype == lasttype:
-    #          # the current token type is the same of the last
-    #          # iteration. cache it
-    #          lastval += value
-    #        else:
-    #          # not the same token as last iteration, but we
-    #          # have some data in the buffer. wrap it with the
-    #          # defined style and write it to the output file
-    #          if lastval:
-    #            stylebegin, styleend = self.styles[lasttype]
-    #            outfile.write(stylebegin + lastval + styleend)
-    #          # set lastval/lasttype to current values
-    #          lastval = value
-    #          lasttype = ttype
-    #
-    #      # if something is left in the buffer, write it to the
-    #      # output file, then close the opened <pre> tag
-    #      if lastval:
-    #        stylebegin, styleend = self.styles[lasttype]
-    #        outfile.write(stylebegin + lastval + styleend)
-
-    #      outfile.write(']')
-
-    #  lexer = get_lexer_for_filename(filename)
-    #  formatter = UrwidFormatter()
-
-    #  from pygments import highlight
-    #  for line in lines:
-    #    line = highlight(line, lexer, formatter)
-    #    text = eval(line)
-    #    #self.lines.append(urwid.Text(line))
-    #    if len(text) > 0:
-    #      self.lines.append(urwid.Text(text))
-    #    else:
-    #      self.lines.append(urwid.Text(''))
-
-    #except ImportError:
-    #  pass
-
-    for lineno, line in enumerate(lines):
-      self.lines.append(urwid.Text('%4d | %s' % (lineno + 1, line)))
+  def set_pc_line(self, line):
+    """ Moves the PC marker (and the focus) to line, rebuilding only the old
+        and new PC lines.
+    """
+    self.invalidate([self.pc_line, line])
+    self.pc_line = line
+    if line is not None and line > 0:
+      self.focus = line - 1
+    self._modified()
 
+  def set_bp_lines(self, lines, changed = None):
+    """ Sets the lines carrying a breakpoint marker (any container of line
+        numbers) and rebuilds only the lines in changed, which is computed
+        when not given.
+    """
+    if changed is None:
+      changed = set(self.bp_lines).symmetric_difference(lines)
+    self.invalidate(changed)
+    self.bp_lines = lines
+    self._modified()
+
+  def invalidate(self, lines):
+    for line in lines:
+      if line is not None:
+        self.widgets.pop(line - 1, None)
+
+  def make_widget(self, pos):
+    text = self.buffer.line(pos)
+    line = pos + 1
+    if line == self.pc_line:
+      marker = self.markerPC
+    elif line in self.bp_lines:
+      marker = self.markerBP
+    else:
+      marker = self.markerNone
+    prefix = '%s%4d | ' % (marker, line)
+
+    if line == self.pc_line:
+      return urwid.Text(('pc', prefix + text))
+
+    spans = self.buffer.spans.get(pos)
+    if spans is None:
+      if self.highlighter is not None:
+        self.highlighter.request(self.buffer, pos)
+      return urwid.Text(prefix + text)
+
+    markup = [prefix]
+    start = 0
+    for attr, length in spans:
+      markup.append((attr, text[start:start + length]))
+      start += length
+    if start < len(text):
+      markup.append(text[start:])
+    return urwid.Text(markup)
+
+  def spans_ready(self, buffer, lines):
+    if buffer is not self.buffer:
+      return
+    for lineno in lines:
+      self.widgets.pop(lineno, None)
     self._modified()
 
   def get_focus(self):
@@ -156,51 +472,200 @@ class SourceWalker(urwid.ListWalker):
     return self._get_at_pos(start_from - 1)
 
   def _get_at_pos(self, pos):
-   if pos < 0:
-     return None, None
-   if len(self.lines) > pos:
-     return self.lines[pos], pos
-   else:
-     return None, None
-
-class SourceWin(urwid.ListBox):
+    if pos < 0:
+      return None, None
+    if self.buffer is None:
+      if pos == 0 and self.msg is not None:
+        return self.msg, pos
+      return None, None
+    if not self.buffer.has_line(pos):
+      return None, None
+
+    w = self.widgets.pop(pos, None)
+    if w is None:
+      w = self.make_widget(pos)
+    self.widgets[pos] = w
+    if len(self.widgets) > self.cache_size:
+      self.widgets.popitem(last = False)
+    return w, pos
+
+class SearchEdit(urwid.Edit):
+  """ Prompt for a search pattern; enter runs the search, esc cancels it. """
+  def __init__(self, enter_callback, cancel_callback):
+    self.enter_callback = enter_callback
+    self.cancel_callback = cancel_callback
+    super(SearchEdit, self).__init__(caption = '/')
+
+  def keypress(self, size, key):
+    if key == 'enter':
+      self.enter_callback(self.get_edit_text())
+    elif key == 'esc':
+      self.cancel_callback()
+    else:
+      return super(SearchEdit, self).keypress(size, key)
+    return None
+
+class SourceWin(urwid.Frame):
   def __init__(self, event_queue, driver):
+    self.event_queue = event_queue
     self.walker = SourceWalker()
-    super(SourceWin, self).__init__(self.walker)
-    event_queue.add_listener(self)
+    self.walker.highlighter = highlight.Highlighter(event_queue, self.walker.spans_ready)
+    self.listbox = urwid.ListBox(self.walker)
+    self.search_edit = SearchEdit(self.start_search, self.end_search)
+    self.search_status = urwid.Text('')
+    self.search = None
+    # (direction, line) of the jump waiting for more search results, if any
+    self.search_pending = None
+    super(SourceWin, self).__init__(body = self.listbox)
+    event_queue.add_listener(self, {
+        lldb.SBTarget.GetBroadcasterClassName():
+            lldb.SBTarget.eBroadcastBitBreakpointChanged,
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitStateChanged,
+        lldb.SBThread.GetBroadcasterClassName():
+            lldb.SBThread.eBroadcastBitStackChanged
+          | lldb.SBThread.eBroadcastBitSelectedFrameChanged
+          | lldb.SBThread.eBroadcastBitThreadSelected,
+      })
+    self.driver = driver
     self.sourceman = driver.getSourceManager()
-    self.sources = {}
+    self.sources = SourceCache()
+    self.resolver = sourcepath.SourceResolver()
 
     self.filename= None
     self.pc_line = None
     self.viewline = 0
 
-    self.breakpoints = { }
-
-    self.markerPC = ":) "
-    self.markerBP = "B> "
-    self.markerNone  = "   "
-
-    # FIXME: syntax highlight broken
-    self.formatter = None
-    self.lexer = None
+    self.breakpoints = BreakpointIndex()
+
+  def keypress(self, size, key):
+    if self.get_focus() == 'body':
+      if key == '/':
+        self.search_edit.set_edit_text('')
+        self.set_footer(self.search_edit)
+        self.set_focus('footer')
+        return None
+      elif key == 'n':
+        self.next_match(1)
+        return None
+      elif key == 'N':
+        self.next_match(-1)
+        return None
+      elif key == 'esc' and self.search is not None:
+        self.end_search()
+        return None
+    return super(SourceWin, self).keypress(size, key)
+
+  def start_search(self, pattern):
+    self.set_footer(self.search_status)
+    self.set_focus('body')
+    if self.search is not None:
+      self.search.cancel()
+    self.search = None
+    if pattern == '' or self.walker.buffer is None:
+      self.end_search()
+      return
+    if isinstance(pattern, unicode):
+      pattern = pattern.encode('utf-8')
+    try:
+      self.search = SourceSearch.get(self.walker.buffer, pattern, self.walker.focus)
+    except re.error as e:
+      self.search_status.set_text('/%s: %s' % (pattern, e))
+      return
+    if not self.search.started:
+      self.search.run(self.event_queue, self.search_found)
+    self.next_match(1, self.walker.focus - 1)
+
+  def end_search(self):
+    if self.search is not None:
+      self.search.cancel()
+    self.search = None
+    self.search_pending = None
+    self.set_footer(None)
+    self.set_focus('body')
+
+  def search_found(self, search):
+    if search is not self.search:
+      return
+    if self.search_pending is not None:
+      self.next_match(*self.search_pending)
+    else:
+      self.show_search_status()
+
+  def next_match(self, direction, current = None):
+    """ Moves the focus to the next (direction 1) or previous (-1) match. """
+    search = self.search
+    if search is None or search.buffer is not self.walker.buffer:
+      return
+    if current is None:
+      current = self.walker.focus
+    if search.complete:
+      lines = search.lines()
+    elif direction > 0 and current >= search.start - 1:
+      # the file is scanned in order from the start line down, so the first
+      # match found below the current line is the next one
+      lines = search.after
+    else:
+      lines = []
+
+    line = None
+    if len(lines) > 0:
+      if direction > 0:
+        i = bisect.bisect_right(lines, current)
+        if i < len(lines):
+          line = lines[i]
+        elif search.complete:
+          line = lines[0]
+      else:
+        # wraps around to the last match when there is none above
+        line = lines[bisect.bisect_left(lines, current) - 1]
+
+    if line is None and not search.complete:
+      # wait for more results
+      self.search_pending = (direction, current)
+    else:
+      self.search_pending = None
+      if line is not None:
+        self.walker.set_focus(line)
+        self.listbox.set_focus_valign('middle')
+    self.show_search_status()
+
+  def show_search_status(self):
+    search = self.search
+    if search is None:
+      return
+    lines = search.lines()
+    status = '/%s: %d matches' % (search.pattern, len(lines))
+    if not search.complete:
+      status += ' (searching)'
+    elif len(lines) == 0:
+      status = '/%s: pattern not found' % search.pattern
+    self.search_status.set_text(status)
 
   def handle_lldb_event(self, event):
-    if lldb.SBBreakpoint.EventIsBreakpointEvent(event):
-      self.handle_bp_event(event)
-    if lldb.SBProcess.EventIsProcessEvent(event) and \
-        not lldb.SBProcess.GetRestartedFromEvent(event):
-      process = lldb.SBProcess.GetProcessFromEvent(event)
-      if not process.IsValid():
-        return
-      if process.GetState() == lldb.eStateStopped:
-        self.refresh_source(process)
-      elif process.GetState() == lldb.eStateExited:
-        self.notify_exited(process)
-    if lldb.SBThread.EventIsThreadEvent(event):
-      thread = lldb.SBThread.GetThreadFromEvent(event)
-      self.refresh_source(thread.process)
-      #self.walker.message(str(event))
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    # the source is refreshed at most once per batch, from the driver's
+    # snapshot of the latest stop
+    refresh = False
+    for event in events:
+      if lldb.SBBreakpoint.EventIsBreakpointEvent(event):
+        self.handle_bp_event(event)
+      if lldb.SBProcess.EventIsProcessEvent(event) and \
+          not lldb.SBProcess.GetRestartedFromEvent(event):
+        process = lldb.SBProcess.GetProcessFromEvent(event)
+        if not process.IsValid():
+          continue
+        if process.GetState() == lldb.eStateStopped:
+          refresh = True
+        elif process.GetState() == lldb.eStateExited:
+          refresh = False
+          self.notify_exited(process)
+      if lldb.SBThread.EventIsThreadEvent(event):
+        refresh = True
+    if refresh:
+      self.refresh_source(self.driver.stop_snapshot)
 
   def notify_exited(self, process):
     target = lldbutil.get_description(process.GetTarget())
@@ -208,19 +673,31 @@ class SourceWin(urwid.ListBox):
     ec = process.GetExitStatus()
     self.walker.message("Process %s [%d] has exited with exit-code %d" % (target, pid, ec))
 
-  def refresh_source(self, process = None):
-    if process is not None:
-      loc = process.GetSelectedThread().GetSelectedFrame().GetLineEntry()
-      f = loc.GetFileSpec()
-      self.pc_line = loc.GetLine()
-
-      if not f.IsValid():
+  def refresh_source(self, snapshot = None):
+    if snapshot is not None:
+      frame = snapshot.selected_frame()
+      if frame is None or frame.filename is None:
         self.walker.set_unavailable()
         return
 
-      self.filename = f.GetFilename()
-      path = os.path.join(f.GetDirectory(), self.filename)
-      self.walker.set_filepath(path)
+      self.pc_line = frame.line
+      self.filename = frame.filename
+      directory = frame.directory
+      path = self.resolver.resolve(directory, self.filename)
+      if path is None:
+        self.walker.set_unavailable('Source file not found: %s' %
+                                    os.path.join(directory or '', self.filename))
+        return
+      try:
+        buffer = self.sources.get(path)
+      except (IOError, OSError) as e:
+        self.resolver.forget(directory, self.filename)
+        self.walker.set_unavailable(e.strerror)
+        return
+      if buffer is not self.walker.buffer:
+        self.walker.set_buffer(buffer)
+        self.walker.set_bp_lines(self.breakpoints.lines(self.filename))
+      self.walker.set_pc_line(self.pc_line)
 
 #  def formatContent(self, content, pc_line, breakpoints):
 #    source = ""
@@ -242,66 +719,36 @@ class SourceWin(urwid.ListBox):
 #      source += line
 #      count = count + 1
 #    return source
-#
-#  def addBPLocations(self, locations):
-#    for path in locations:
-#      lines = locations[path]
-#      if path in self.breakpoints:
-#        self.breakpoints[path].update(lines)
-#      else:
-#        self.breakpoints[path] = lines
-#
-#  def removeBPLocations(self, locations):
-#    for path in locations:
-#      lines = locations[path]
-#      if path in self.breakpoints:
-#        self.breakpoints[path].difference_update(lines)
-#      else:
-#        raise "Removing locations that were never added...no good"
 #
   def handle_bp_event(self, event):
-    def getLocations(event):
-      locs = {}
-
-      bp = lldb.SBBreakpoint.GetBreakpointFromEvent(event)
-
-      if bp.IsInternal():
-        # don't show anything for internal breakpoints
-        return
-
-      for location in bp:
-        # hack! getting the LineEntry via SBBreakpointLocation.GetAddress.GetLineEntry does not work good for
-        # inlined frames, so we get the description (which does take into account inlined functions) and parse it.
-        desc = lldbutil.get_description(location, lldb.eDescriptionLevelFull)
-        match = re.search('at\ ([^:]+):([\d]+)', desc)
-        try:
-          path = match.group(1)
-          line = int(match.group(2).strip())
-        except ValueError as e:
-          # bp loc unparsable
-          continue
+    bp = lldb.SBBreakpoint.GetBreakpointFromEvent(event)
+    if bp.IsInternal():
+      # don't show anything for internal breakpoints
+      return
 
-        if path in locs:
-          locs[path].add(line)
-        else:
-          locs[path] = set([line])
-      return locs
-
-    #event_type = lldb.SBBreakpoint.GetBreakpointEventTypeFromEvent(event)
-    #if event_type == lldb.eBreakpointEventTypeEnabled \
-    #    or event_type == lldb.eBreakpointEventTypeAdded \
-    #    or event_type == lldb.eBreakpointEventTypeLocationsResolved \
-    #    or event_type == lldb.eBreakpointEventTypeLocationsAdded:
-    #  self.addBPLocations(getLocations(event))
-    #elif event_type == lldb.eBreakpointEventTypeRemoved \
-    #    or event_type == lldb.eBreakpointEventTypeLocationsRemoved \
-    #    or event_type == lldb.eBreakpointEventTypeDisabled:
-    #  self.removeBPLocations(getLocations(event))
-    #elif event_type == lldb.eBreakpointEventTypeCommandChanged \
-    #    or event_type == lldb.eBreakpointEventTypeConditionChanged \
-    #    or event_type == lldb.eBreakpointEventTypeIgnoreChanged \
-    #    or event_type == lldb.eBreakpointEventTypeThreadChanged \
-    #    or event_type == lldb.eBreakpointEventTypeInvalidType:
-    #  # no-op
-    #  pass
-    self.refresh_source()
+    def event_locations():
+      n = lldb.SBBreakpoint.GetNumBreakpointLocationsFromEvent(event)
+      return [lldb.SBBreakpoint.GetBreakpointLocationAtIndexFromEvent(event, i)
+              for i in range(n)]
+
+    changed = None
+    event_type = lldb.SBBreakpoint.GetBreakpointEventTypeFromEvent(event)
+    if event_type == lldb.eBreakpointEventTypeEnabled \
+        or event_type == lldb.eBreakpointEventTypeAdded:
+      if bp.IsEnabled():
+        changed = self.breakpoints.add(bp.GetID(), get_line_locations(bp))
+    elif event_type == lldb.eBreakpointEventTypeLocationsResolved \
+        or event_type == lldb.eBreakpointEventTypeLocationsAdded:
+      if bp.IsEnabled():
+        changed = self.breakpoints.add(bp.GetID(), get_line_locations(event_locations()))
+    elif event_type == lldb.eBreakpointEventTypeLocationsRemoved:
+      changed = self.breakpoints.remove(bp.GetID(), [loc.GetID() for loc in event_locations()])
+    elif event_type == lldb.eBreakpointEventTypeRemoved \
+        or event_type == lldb.eBreakpointEventTypeDisabled:
+      changed = self.breakpoints.remove(bp.GetID())
+    # other event types (command, condition, ignore count, thread) do not
+    # move any marker
+
+    if changed and self.filename in changed:
+      self.walker.set_bp_lines(self.breakpoints.lines(self.filename),
+                               changed[self.filename])
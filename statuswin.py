@@ -12,18 +12,65 @@ import urwid
 
 class StatusWin(urwid.Columns):
   def __init__(self, event_queue):
-    event_queue.add_listener(self)
+    self.event_queue = event_queue
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitStateChanged
+      })
+    event_queue.add_drain_callback(self.update_queue_stats)
+    self.queue_stats = None
+    # shown with F2 when lui runs with --debug
+    self.timings = event_queue.timings
+    self.show_timings = False
 
     items = [
         ('title', "LUI"), "    ",
         ('key', "F1"), " Help ",
+      ]
+    if self.timings is not None:
+      items += [('key', "F2"), " Timings "]
+    items += [
         ('key', "F3"), " Cycle-focus ",
         ('key', "F10"), " Quit "
       ]
     self.text = urwid.Text(items)
     self.status = urwid.Text('', align='right')
     self.status_attr = urwid.AttrWrap(self.status, 'stopped')
-    super(StatusWin, self).__init__([self.text, self.status_attr])
+    self.queue_status = urwid.Text('', align='right')
+    super(StatusWin, self).__init__([self.text, self.queue_status, self.status_attr])
+
+  def toggle_timings(self):
+    if self.timings is None:
+      return
+    self.show_timings = not self.show_timings
+    self.update_queue_stats()
+
+  def timings_text(self):
+    """ p50/p99 of the slowest window and of the commands, in ms. """
+    parts = []
+    slowest = self.timings.slowest(exclude = ('handleCommand',))
+    for name, label in [(slowest, slowest), ('handleCommand', 'cmd')]:
+      h = self.timings.get(name) if name is not None else None
+      if h is not None:
+        parts.append('%s %.1f/%.1f' % (label, h.percentile(50) * 1000,
+                                       h.percentile(99) * 1000))
+    if len(parts) == 0:
+      return 'no timings yet'
+    return 'p50/p99 ms: ' + ', '.join(parts)
+
+  def update_queue_stats(self):
+    if self.show_timings:
+      self.queue_stats = None
+      self.queue_status.set_text(self.timings_text())
+      return
+    stats = (self.event_queue.dropped, self.event_queue.merged)
+    if stats == self.queue_stats:
+      return
+    self.queue_stats = stats
+    if stats == (0, 0):
+      self.queue_status.set_text('')
+    else:
+      self.queue_status.set_text('events dropped: %d merged: %d' % stats)
 
   def handle_lldb_event(self, event):
     if lldb.SBProcess.EventIsProcessEvent(event):
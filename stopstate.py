@@ -0,0 +1,141 @@
+##===-- stopstate.py -----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+"""
+Immutable snapshots of a stopped process.
+
+The driver takes one per stop, on its own thread, before the stop event is
+handed to the windows; they read it instead of walking the SB API each.
+"""
+
+from collections import namedtuple
+
+# directory, filename and function are None if unknown, line is 0
+FrameSnapshot = namedtuple('FrameSnapshot',
+    ['index', 'pc', 'function', 'directory', 'filename', 'line'])
+
+ThreadSnapshot = namedtuple('ThreadSnapshot',
+    ['tid', 'index_id', 'name', 'stop_reason', 'frame'])
+
+class ThreadList(object):
+  """ Immutable sequence of ThreadSnapshots, stored in chunks so that
+  replacing one thread copies a chunk rather than the whole list.
+  """
+  __slots__ = ('chunks', 'length')
+  chunk_size = 256
+
+  def __init__(self, threads, chunks = None, length = 0):
+    if chunks is None:
+      threads = tuple(threads)
+      n = self.chunk_size
+      chunks = tuple(threads[i:i + n] for i in range(0, len(threads), n))
+      length = len(threads)
+    self.chunks = chunks
+    self.length = length
+
+  def __len__(self):
+    return self.length
+
+  def __getitem__(self, i):
+    if i < 0:
+      i += self.length
+    if not 0 <= i < self.length:
+      raise IndexError(i)
+    return self.chunks[i // self.chunk_size][i % self.chunk_size]
+
+  def __iter__(self):
+    for chunk in self.chunks:
+      for thread in chunk:
+        yield thread
+
+  def replace(self, i, thread):
+    """ Returns a copy with the thread at position i replaced. """
+    c, j = divmod(i, self.chunk_size)
+    chunk = self.chunks[c]
+    chunk = chunk[:j] + (thread,) + chunk[j + 1:]
+    return ThreadList(None, self.chunks[:c] + (chunk,) + self.chunks[c + 1:],
+                      self.length)
+
+class StopSnapshot(namedtuple('StopSnapshot',
+    ['stop_id', 'pid', 'state', 'threads', 'selected', 'positions'])):
+  """ The threads of a process at one of its stops, each with its selected
+  frame, as a ThreadList. selected is the position of the selected thread
+  and positions maps thread IDs to their position; it must not be modified.
+  """
+  __slots__ = ()
+
+  def thread(self, tid):
+    i = self.positions.get(tid)
+    if i is None:
+      return None
+    return self.threads[i]
+
+  def selected_thread(self):
+    if 0 <= self.selected < len(self.threads):
+      return self.threads[self.selected]
+    return None
+
+  def selected_frame(self):
+    thread = self.selected_thread()
+    if thread is None:
+      return None
+    return thread.frame
+
+def take_frame(frame):
+  if not frame.IsValid():
+    return None
+  loc = frame.GetLineEntry()
+  f = loc.GetFileSpec()
+  directory = filename = None
+  if f.IsValid():
+    directory = f.GetDirectory()
+    filename = f.GetFilename()
+  return FrameSnapshot(frame.GetFrameID(), frame.GetPC(), frame.GetFunctionName(),
+                       directory, filename, loc.GetLine())
+
+def take_thread(thread):
+  return ThreadSnapshot(thread.GetThreadID(), thread.GetIndexID(),
+                        thread.GetName(), thread.GetStopReason(),
+                        take_frame(thread.GetSelectedFrame()))
+
+def take(process):
+  """ Returns a StopSnapshot of process, which must be stopped. """
+  threads = ThreadList(take_thread(process.GetThreadAtIndex(i))
+                       for i in range(process.GetNumThreads()))
+  positions = dict((thread.tid, i) for i, thread in enumerate(threads))
+  selected = positions.get(process.GetSelectedThread().GetThreadID(), -1)
+  return StopSnapshot(process.GetStopID(), process.GetProcessID(),
+                      process.GetState(), threads, selected, positions)
+
+def changed_threads(old, new):
+  """ Returns the IDs of the threads of new that differ from, or are not in,
+      old, which may be None.
+  """
+  if old is None:
+    return set(thread.tid for thread in new.threads)
+  if old.positions is new.positions:
+    # within a stop, only the replaced chunks can differ
+    changed = set()
+    for a, b in zip(old.threads.chunks, new.threads.chunks):
+      if a is not b:
+        changed.update(t.tid for t, u in zip(b, a) if t != u)
+    return changed
+  return set(thread.tid for thread in new.threads if old.thread(thread.tid) != thread)
+
+def update_thread(snapshot, process, thread):
+  """ Returns a copy of snapshot with thread and the selection re-read, after
+      a frame or thread was selected or a stack changed within the stop.
+  """
+  selected = snapshot.positions.get(process.GetSelectedThread().GetThreadID(),
+                                    snapshot.selected)
+  i = snapshot.positions.get(thread.GetThreadID())
+  if i is None:
+    return snapshot._replace(selected = selected)
+  threads = snapshot.threads.replace(i, take_thread(thread))
+  return snapshot._replace(threads = threads, selected = selected)
@@ -0,0 +1,227 @@
+##===-- threadwin.py -----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import lldb, lldbutil
+import stopstate
+from collections import OrderedDict
+
+# groups of threads, in the order they are shown
+groups = ['breakpoint', 'crashed', 'watchpoint', 'signal', 'exiting', 'other']
+
+# the stop reasons lldbutil.stop_reason_to_str() has a name for
+named_stop_reasons = frozenset([
+    lldb.eStopReasonInvalid, lldb.eStopReasonNone, lldb.eStopReasonTrace,
+    lldb.eStopReasonBreakpoint, lldb.eStopReasonWatchpoint,
+    lldb.eStopReasonSignal, lldb.eStopReasonException, lldb.eStopReasonExec,
+    lldb.eStopReasonPlanComplete, lldb.eStopReasonThreadExiting,
+  ])
+
+def stop_reason_str(reason):
+  """ Returns the name of reason, or its number for the reasons of newer
+  lldbs that lldbutil does not know.
+  """
+  if reason in named_stop_reasons:
+    return lldbutil.stop_reason_to_str(reason)
+  return 'reason %d' % reason
+
+class ThreadWalker(urwid.ListWalker):
+  """ The threads of the last stop, grouped by stop reason.
+
+  rows holds a (group, None) entry per group header and a (group, tid)
+  entry per thread; widgets are only built for the rows displayed and are
+  kept across stops, per thread, unless the thread changed. Threads that
+  changed since the previous stop are highlighted.
+  """
+  cache_size = 512
+
+  def __init__(self):
+    self.snapshot = None
+    self.rows = []
+    # tid -> position in rows
+    self.row_of = {}
+    self.group_sizes = {}
+    self.collapsed = set()
+    # threads that changed at the last stop
+    self.changed = set()
+    self.focus = 0
+    self.focus_row = None
+    # tid or group -> widget
+    self.widgets = OrderedDict()
+
+  def update(self, snapshot):
+    old = self.snapshot
+    if snapshot is old:
+      return
+    self.snapshot = snapshot
+    if snapshot is None:
+      self.rows = []
+      self.row_of = {}
+      self.widgets.clear()
+      self._modified()
+      return
+
+    changed = stopstate.changed_threads(old, snapshot)
+    if old is not None and old.positions is snapshot.positions:
+      # the same stop: the threads that changed now were highlighted anyway
+      self.changed |= changed
+      regroup = any(old.thread(tid).stop_reason != snapshot.thread(tid).stop_reason
+                    for tid in changed)
+      stale = changed
+    else:
+      stale = changed | self.changed
+      self.changed = changed
+      regroup = True
+    if old is not None:
+      for thread in [old.selected_thread(), snapshot.selected_thread()]:
+        if thread is not None:
+          stale.add(thread.tid)
+    for tid in stale:
+      self.widgets.pop(tid, None)
+    if regroup:
+      self.regroup()
+    self._modified()
+
+  def regroup(self):
+    lists = dict((group, []) for group in groups)
+    lldbutil.sort_stopped_threads(self.snapshot.threads,
+                                  lists['breakpoint'], lists['crashed'],
+                                  lists['watchpoint'], lists['signal'],
+                                  lists['exiting'], lists['other'],
+                                  stop_reason = lambda thread: thread.stop_reason)
+    rows = []
+    for group in groups:
+      threads = lists[group]
+      if len(threads) == 0:
+        continue
+      rows.append((group, None))
+      self.widgets.pop(group, None)
+      if group not in self.collapsed:
+        rows.extend((group, thread.tid) for thread in threads)
+    self.rows = rows
+    self.row_of = dict((tid, i) for i, (group, tid) in enumerate(rows) if tid is not None)
+    self.group_sizes = dict((group, len(lists[group])) for group in groups)
+
+    # keep the focus on the same thread or group
+    if self.focus_row is not None:
+      group, tid = self.focus_row
+      if tid in self.row_of:
+        self.focus = self.row_of[tid]
+      elif (group, None) in rows:
+        self.focus = rows.index((group, None))
+    self.focus = max(0, min(self.focus, len(rows) - 1))
+
+  def toggle(self, pos):
+    """ Collapses or expands the group of the row at pos. """
+    if not 0 <= pos < len(self.rows):
+      return
+    group, tid = self.rows[pos]
+    if group in self.collapsed:
+      self.collapsed.remove(group)
+    else:
+      self.collapsed.add(group)
+    self.focus_row = (group, None)
+    self.regroup()
+    self._modified()
+
+  def get_focus(self):
+    return self._get_at_pos(self.focus)
+
+  def set_focus(self, focus):
+    self.focus = focus
+    if 0 <= focus < len(self.rows):
+      self.focus_row = self.rows[focus]
+    self._modified()
+
+  def get_next(self, start_from):
+    return self._get_at_pos(start_from + 1)
+
+  def get_prev(self, start_from):
+    return self._get_at_pos(start_from - 1)
+
+  def _get_at_pos(self, pos):
+    if not 0 <= pos < len(self.rows):
+      return None, None
+    group, tid = self.rows[pos]
+    key = group if tid is None else tid
+    w = self.widgets.pop(key, None)
+    if w is None:
+      if tid is None:
+        w = self.make_header(group)
+      else:
+        w = self.make_row(self.snapshot.thread(tid))
+    self.widgets[key] = w
+    if len(self.widgets) > self.cache_size:
+      self.widgets.popitem(last = False)
+    return w, pos
+
+  def make_header(self, group):
+    marker = '+' if group in self.collapsed else '-'
+    text = '%s %s (%d)' % (marker, group, self.group_sizes[group])
+    return urwid.AttrWrap(urwid.Text(text), 'title', 'key')
+
+  def make_row(self, thread):
+    selected = self.snapshot.selected_thread()
+    marker = '*' if selected is not None and selected.tid == thread.tid else ' '
+    text = '%s #%d tid 0x%x' % (marker, thread.index_id, thread.tid)
+    if thread.name:
+      text += ' %s' % thread.name
+    text += ' %s' % stop_reason_str(thread.stop_reason)
+    frame = thread.frame
+    if frame is not None:
+      if frame.function:
+        text += ' %s' % frame.function
+      if frame.filename:
+        text += ' at %s:%d' % (frame.filename, frame.line)
+    attr = 'stopped' if thread.tid in self.changed else None
+    return urwid.AttrWrap(urwid.Text(text), attr, 'key')
+
+class ThreadWin(urwid.Frame):
+  """ Threads of the stopped process. Enter selects a thread, or collapses
+  or expands a group.
+  """
+  def __init__(self, event_queue, driver):
+    self.driver = driver
+    self.walker = ThreadWalker()
+    self.status = urwid.Text('')
+    super(ThreadWin, self).__init__(body = urwid.ListBox(self.walker),
+                                    header = self.status)
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitStateChanged,
+        lldb.SBThread.GetBroadcasterClassName():
+            lldb.SBThread.eBroadcastBitStackChanged
+          | lldb.SBThread.eBroadcastBitSelectedFrameChanged
+          | lldb.SBThread.eBroadcastBitThreadSelected,
+      })
+
+  def keypress(self, size, key):
+    if key == 'enter':
+      pos = self.walker.focus
+      if 0 <= pos < len(self.walker.rows):
+        group, tid = self.walker.rows[pos]
+        if tid is None:
+          self.walker.toggle(pos)
+        else:
+          thread = self.walker.snapshot.thread(tid)
+          self.driver.handleCommandAsync('thread select %d' % thread.index_id)
+      return None
+    return super(ThreadWin, self).keypress(size, key)
+
+  def handle_lldb_event(self, event):
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    snapshot = self.driver.stop_snapshot
+    if snapshot is None:
+      self.status.set_text('(process not stopped)')
+      return
+    self.walker.update(snapshot)
+    self.status.set_text('%d threads, stop %d' % (len(snapshot.threads),
+                                                   snapshot.stop_id))
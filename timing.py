@@ -0,0 +1,81 @@
+##===-- timing.py --------------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import math
+import threading
+
+class Histogram(object):
+  """ Distribution of durations, in buckets growing by a factor of growth
+  from base seconds. Its size does not depend on the number of samples;
+  percentiles are accurate to one bucket (about 19%).
+  """
+  base = 1e-6
+  growth = 2 ** 0.25
+  # up to about 16 seconds
+  buckets = 96
+
+  def __init__(self):
+    self.counts = [0] * self.buckets
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def add(self, elapsed):
+    i = 0
+    if elapsed > self.base:
+      i = min(int(math.log(elapsed / self.base, self.growth)), self.buckets - 1)
+    self.counts[i] += 1
+    self.count += 1
+    self.total += elapsed
+    self.max = max(self.max, elapsed)
+
+  def percentile(self, p):
+    """ Returns an upper bound of the p-th percentile, in seconds. """
+    if self.count == 0:
+      return 0.0
+    rank = p / 100.0 * self.count
+    seen = 0
+    for i, n in enumerate(self.counts):
+      seen += n
+      if n > 0 and seen >= rank:
+        return min(self.base * self.growth ** (i + 1), self.max)
+    return self.max
+
+class Timings(object):
+  """ A histogram per name, shared by the UI and the driver threads. """
+  def __init__(self):
+    self.histograms = {}
+    self.lock = threading.Lock()
+
+  def add(self, name, elapsed):
+    with self.lock:
+      histogram = self.histograms.get(name)
+      if histogram is None:
+        histogram = self.histograms[name] = Histogram()
+      histogram.add(elapsed)
+
+  def get(self, name):
+    return self.histograms.get(name)
+
+  def slowest(self, exclude = ()):
+    """ Returns the name with the highest p99, or None. """
+    with self.lock:
+      names = [name for name in self.histograms if name not in exclude]
+      if len(names) == 0:
+        return None
+      return max(names, key = lambda name: self.histograms[name].percentile(99))
+
+  def report(self):
+    lines = ['%-20s %8s %10s %10s %10s' % ('', 'calls', 'p50 ms', 'p99 ms', 'max ms')]
+    with self.lock:
+      for name in sorted(self.histograms):
+        h = self.histograms[name]
+        lines.append('%-20s %8d %10.2f %10.2f %10.2f' % (name, h.count,
+            h.percentile(50) * 1000, h.percentile(99) * 1000, h.max * 1000))
+    return '\n'.join(lines)
@@ -0,0 +1,125 @@
+##===-- variables.py -----------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+"""
+The variables of a frame, as a tree that is only read where it is expanded.
+
+Each value is read once per stop: nodes are cached by (stop, frame,
+expression path), and their children are only fetched when the node is
+expanded, max_children at a time and no deeper than max_depth, so that huge
+containers and long linked lists are never walked as a whole.
+"""
+
+from collections import namedtuple
+
+# see --max-children and --max-depth
+max_children = 100
+max_depth = 16
+
+# type, value and summary are None if unknown; has_children is only a hint
+ValueInfo = namedtuple('ValueInfo',
+    ['name', 'type', 'value', 'summary', 'has_children'])
+
+def value_info(value):
+  """ Reads value itself, but none of its children, nor their number:
+  synthetic children of linked containers are counted by walking them.
+  """
+  return ValueInfo(value.GetName() or '', value.GetTypeName(),
+                   value.GetValue(), value.GetSummary(),
+                   value.MightHaveChildren())
+
+def num_children(value, limit):
+  """ Returns the number of children of value, counted up to limit. """
+  try:
+    return value.GetNumChildren(limit)
+  except (TypeError, NotImplementedError):
+    # lldb without the bounded count
+    return value.GetNumChildren()
+
+def child_path(path, name):
+  if name.startswith('['):
+    return path + name
+  if name.startswith('*'):
+    return '*(%s)' % path
+  return path + '.' + name
+
+class Node(object):
+  """ A value, its children read so far (None until first expanded), and
+  whether it can be expanded at all.
+  """
+  __slots__ = ('path', 'depth', 'value', 'info', 'children', 'has_more',
+               'count')
+
+  def __init__(self, path, depth, value):
+    self.path = path
+    self.depth = depth
+    self.value = value
+    self.info = value_info(value)
+    self.children = None
+    self.has_more = False
+    # the number of children, if it is known exactly
+    self.count = None
+
+  def expandable(self):
+    return self.info.has_children and self.depth < max_depth
+
+  def read_children(self, cache, frame):
+    """ Reads the next max_children children. """
+    if self.children is None:
+      self.children = []
+    start = len(self.children)
+    end = start + max_children
+    # one more than is read tells whether there are others
+    n = num_children(self.value, end + 1)
+    self.has_more = n > end
+    # a count that stopped at the limit is only a lower bound
+    self.count = n if n <= end or n > end + 1 else None
+    for i in range(start, min(end, n)):
+      child = self.value.GetChildAtIndex(i)
+      path = child_path(self.path, child.GetName() or '[%d]' % i)
+      self.children.append(cache.node(frame, path, self.depth + 1, child))
+
+class ValueCache(object):
+  """ Nodes by (frame, expression path) for one stop; frame is a
+  (tid, frame index) pair. Moving to another stop drops all of them.
+  """
+  def __init__(self):
+    self.stop = None
+    self.nodes = {}
+    # frame -> [Node]
+    self.roots = {}
+
+  def set_stop(self, stop):
+    if stop != self.stop:
+      self.stop = stop
+      self.nodes = {}
+      self.roots = {}
+
+  def node(self, frame, path, depth, value):
+    key = (frame, path)
+    node = self.nodes.get(key)
+    if node is None:
+      node = self.nodes[key] = Node(path, depth, value)
+    return node
+
+  def variables(self, frame, sbframe):
+    """ Returns the root nodes of frame: its arguments and locals. """
+    roots = self.roots.get(frame)
+    if roots is None:
+      values = sbframe.GetVariables(True, True, False, True)
+      roots = []
+      for i in range(values.GetSize()):
+        value = values.GetValueAtIndex(i)
+        path = value.GetName() or ''
+        if (frame, path) in self.nodes:
+          # shadowed by a variable of an inner scope
+          path = '%s@%d' % (path, i)
+        roots.append(self.node(frame, path, 0, value))
+      self.roots[frame] = roots
+    return roots
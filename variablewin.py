@@ -0,0 +1,196 @@
+##===-- variablewin.py ---------------------------------------*- Python -*-===##
+##
+##                     The LLVM Compiler Infrastructure
+##
+## This file is distributed under the University of Illinois Open Source
+## License. See LICENSE.TXT for details.
+##
+##===----------------------------------------------------------------------===##
+
+import urwid
+import lldb
+import variables
+from collections import OrderedDict
+
+class Row(urwid.Text):
+  # selectable, so that up and down move from value to value
+  _selectable = True
+
+  def keypress(self, size, key):
+    return key
+
+class VariableWalker(urwid.ListWalker):
+  """ The expanded part of the variables tree of one frame.
+
+  rows holds a (node, False) entry per value shown and a (node, True) entry
+  after the children of a node that has more than were read. The paths
+  expanded are kept across stops, so stepping keeps the same values open.
+  """
+  cache_size = 256
+
+  def __init__(self, cache):
+    self.cache = cache
+    self.frame = None
+    self.roots = []
+    self.rows = []
+    self.expanded = set()
+    self.focus = 0
+    self.focus_row = None
+    # (path, more) -> widget
+    self.widgets = OrderedDict()
+
+  def set_roots(self, frame, roots):
+    self.frame = frame
+    self.roots = roots
+    self.widgets.clear()
+    self.rebuild()
+
+  def rebuild(self):
+    rows = []
+    def add(node):
+      rows.append((node, False))
+      if node.path in self.expanded and node.expandable():
+        if node.children is None:
+          node.read_children(self.cache, self.frame)
+        for child in node.children:
+          add(child)
+        if node.has_more:
+          rows.append((node, True))
+    for node in self.roots:
+      add(node)
+    self.rows = rows
+
+    # keep the focus on the same row
+    if self.focus_row is not None:
+      for i, (node, more) in enumerate(rows):
+        if (node.path, more) == self.focus_row:
+          self.focus = i
+          break
+    self.focus = max(0, min(self.focus, len(rows) - 1))
+    self._modified()
+
+  def toggle(self, pos, expand = None):
+    """ Expands or collapses the node at pos, or reads more children. """
+    if not 0 <= pos < len(self.rows):
+      return
+    node, more = self.rows[pos]
+    if more:
+      node.read_children(self.cache, self.frame)
+    elif not node.expandable():
+      return
+    elif node.path in self.expanded:
+      if expand is True:
+        return
+      self.expanded.remove(node.path)
+    else:
+      if expand is False:
+        return
+      self.expanded.add(node.path)
+    self.widgets.pop((node.path, False), None)
+    self.widgets.pop((node.path, True), None)
+    self.rebuild()
+
+  def get_focus(self):
+    return self._get_at_pos(self.focus)
+
+  def set_focus(self, focus):
+    self.focus = focus
+    if 0 <= focus < len(self.rows):
+      node, more = self.rows[focus]
+      self.focus_row = (node.path, more)
+    self._modified()
+
+  def get_next(self, start_from):
+    return self._get_at_pos(start_from + 1)
+
+  def get_prev(self, start_from):
+    return self._get_at_pos(start_from - 1)
+
+  def _get_at_pos(self, pos):
+    if not 0 <= pos < len(self.rows):
+      return None, None
+    node, more = self.rows[pos]
+    key = (node.path, more)
+    w = self.widgets.pop(key, None)
+    if w is None:
+      w = self.make_widget(node, more)
+    self.widgets[key] = w
+    if len(self.widgets) > self.cache_size:
+      self.widgets.popitem(last = False)
+    return w, pos
+
+  def make_widget(self, node, more):
+    if more:
+      if node.count is None:
+        text = '  ' * (node.depth + 1) + '  (more)'
+      else:
+        text = '  ' * (node.depth + 1) + '  (%d more)' % (node.count - len(node.children))
+      return urwid.AttrWrap(Row(text), 'comment', 'key')
+    info = node.info
+    if not node.expandable():
+      marker = '.' if info.has_children else ' '
+    elif node.path in self.expanded:
+      marker = '-'
+    else:
+      marker = '+'
+    text = '%s%s (%s) %s' % ('  ' * node.depth, marker, info.type or '?', info.name)
+    value = info.summary or info.value
+    if value is not None:
+      text += ' = %s' % value
+    return urwid.AttrWrap(Row(text), None, 'key')
+
+class VariableWin(urwid.Frame):
+  """ Arguments and locals of the selected frame. Enter expands or collapses
+  a value, or reads more of its children; right and left expand and
+  collapse.
+  """
+  def __init__(self, event_queue, driver):
+    self.driver = driver
+    self.cache = variables.ValueCache()
+    self.walker = VariableWalker(self.cache)
+    self.status = urwid.Text('')
+    super(VariableWin, self).__init__(body = urwid.ListBox(self.walker),
+                                      header = self.status)
+    event_queue.add_listener(self, {
+        lldb.SBProcess.GetBroadcasterClassName():
+            lldb.SBProcess.eBroadcastBitStateChanged,
+        lldb.SBThread.GetBroadcasterClassName():
+            lldb.SBThread.eBroadcastBitStackChanged
+          | lldb.SBThread.eBroadcastBitSelectedFrameChanged
+          | lldb.SBThread.eBroadcastBitThreadSelected,
+      })
+
+  def keypress(self, size, key):
+    if key in ('enter', 'right', 'left'):
+      expand = {'enter': None, 'right': True, 'left': False}[key]
+      self.walker.toggle(self.walker.focus, expand)
+      return None
+    return super(VariableWin, self).keypress(size, key)
+
+  def handle_lldb_event(self, event):
+    self.handle_lldb_events([event])
+
+  def handle_lldb_events(self, events):
+    snapshot = self.driver.stop_snapshot
+    if snapshot is None:
+      # the values of a running process cannot be read
+      self.walker.set_roots(None, [])
+      self.cache.set_stop(None)
+      self.status.set_text('(process not stopped)')
+      return
+    thread = snapshot.selected_thread()
+    if thread is None or thread.frame is None:
+      self.walker.set_roots(None, [])
+      self.status.set_text('no frame selected')
+      return
+    self.cache.set_stop((snapshot.pid, snapshot.stop_id))
+    frame = (thread.tid, thread.frame.index)
+    roots = self.cache.roots.get(frame)
+    if roots is None:
+      process = self.driver.getTarget().GetProcess()
+      sbframe = process.GetThreadByID(thread.tid).GetFrameAtIndex(thread.frame.index)
+      roots = self.cache.variables(frame, sbframe)
+    if frame != self.walker.frame or roots is not self.walker.roots:
+      self.walker.set_roots(frame, roots)
+    self.status.set_text('frame #%d of thread #%d, %d variables'
+                         % (thread.frame.index, thread.index_id, len(roots)))